@@ -1,9 +1,12 @@
 from django.contrib import admin
-from .models import Municipio, DadosEvasao, PrevisaoEvasao, MetricasModelo
+from .models import (Municipio, DadosEvasao, PrevisaoEvasao, MetricasModelo, ExecucaoProcessamento,
+                     RegistroMunicipioExecucao, ProblemaQualidade, PrevisaoMembroEnsemble,
+                     IndiceSimilaridade)
 
 @admin.register(Municipio)
 class MunicipioAdmin(admin.ModelAdmin):
     list_display = ('codigo', 'nome', 'uf', 'regiao')
+    list_filter = ('uf',)
     search_fields = ('nome', 'codigo')
 
 @admin.register(DadosEvasao)
@@ -18,7 +21,36 @@ class PrevisaoEvasaoAdmin(admin.ModelAdmin):
     list_filter = ('ano', 'municipio__uf')
     search_fields = ('municipio__nome',)
 
+@admin.register(PrevisaoMembroEnsemble)
+class PrevisaoMembroEnsembleAdmin(admin.ModelAdmin):
+    list_display = ('municipio', 'ano', 'modelo', 'previsao', 'peso')
+    list_filter = ('ano', 'modelo', 'municipio__uf')
+    search_fields = ('municipio__nome',)
+
+@admin.register(IndiceSimilaridade)
+class IndiceSimilaridadeAdmin(admin.ModelAdmin):
+    list_display = ('id', 'municipios', 'vizinhos', 'ano_inicial', 'ano_final', 'criado_em')
+    exclude = ('codigos', 'indices', 'distancias')
+
 @admin.register(MetricasModelo)
 class MetricasModeloAdmin(admin.ModelAdmin):
     list_display = ('municipio', 'mae', 'rmse', 'mape', 'data_calculo')
-    search_fields = ('municipio__nome',)
\ No newline at end of file
+    search_fields = ('municipio__nome',)
+
+@admin.register(ExecucaoProcessamento)
+class ExecucaoProcessamentoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'arquivo', 'ufs', 'modo_intervalo', 'ensemble', 'fallback_anomalias', 'status',
+                    'municipios_processados', 'municipios_com_falha', 'iniciada_em', 'finalizada_em')
+    list_filter = ('status',)
+
+@admin.register(RegistroMunicipioExecucao)
+class RegistroMunicipioExecucaoAdmin(admin.ModelAdmin):
+    list_display = ('execucao', 'codigo', 'uf', 'shard', 'status', 'registrado_em')
+    list_filter = ('status', 'uf')
+    search_fields = ('codigo', 'mensagem')
+
+@admin.register(ProblemaQualidade)
+class ProblemaQualidadeAdmin(admin.ModelAdmin):
+    list_display = ('execucao', 'codigo', 'ano', 'tipo', 'valor', 'detalhe')
+    list_filter = ('tipo', 'ano')
+    search_fields = ('codigo',)
\ No newline at end of file
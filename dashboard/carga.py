@@ -0,0 +1,295 @@
+import http.cookiejar
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import contextmanager
+import numpy as np
+
+# Modos de servir a aplicação nos testes de carga
+SERVIDORES = {
+    'wsgi': ['evasao_project.wsgi:application'],
+    'asgi': ['evasao_project.asgi:application', '-k', 'uvicorn_worker.UvicornWorker'],
+}
+
+# Códigos dos municípios sintéticos, fora da faixa de códigos do IBGE
+CODIGO_SINTETICO_INICIAL = 9900000
+
+UFS_SINTETICAS = {
+    'SP': 'Sudeste', 'MG': 'Sudeste', 'BA': 'Nordeste', 'PE': 'Nordeste',
+    'RS': 'Sul', 'PR': 'Sul', 'GO': 'Centro-Oeste', 'PA': 'Norte',
+}
+
+
+class _SemRedirecionamento(urllib.request.HTTPRedirectHandler):
+    """Trata redirecionamentos (ex.: para o login) como erro, em vez de segui-los"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_abrir = urllib.request.build_opener(_SemRedirecionamento).open
+
+
+def entrar(url_base, usuario, senha, caminho_login='/accounts/login/'):
+    """
+    Faz login pelo formulário, como um navegador, e devolve os cookies da sessão
+
+    Args:
+        url_base (str): Endereço do servidor
+        usuario (str): Nome de usuário
+        senha (str): Senha
+        caminho_login (str): Caminho do formulário de login
+
+    Returns:
+        dict: Cookies (sessão e CSRF) a enviar nas requisições seguintes
+    """
+    cookies = http.cookiejar.CookieJar()
+    abrir = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(cookies), _SemRedirecionamento).open
+    url = url_base.rstrip('/') + caminho_login
+
+    with abrir(url, timeout=30) as resposta:
+        pagina = resposta.read().decode('utf-8')
+    token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', pagina)
+    if token is None:
+        raise ValueError(f"Formulário de login sem token CSRF em {caminho_login}")
+
+    corpo = urllib.parse.urlencode({
+        'username': usuario, 'password': senha, 'csrfmiddlewaretoken': token.group(1),
+    }).encode()
+    pedido = urllib.request.Request(url, data=corpo, headers={'Referer': url})
+    try:
+        # Login aceito responde com redirecionamento, que aqui vira HTTPError 302
+        with abrir(pedido, timeout=30):
+            pass
+    except urllib.error.HTTPError as e:
+        if e.code != 302:
+            raise
+
+    from django.conf import settings
+
+    sessao = {cookie.name: cookie.value for cookie in cookies}
+    if settings.SESSION_COOKIE_NAME not in sessao:
+        raise ValueError(f"Login de '{usuario}' recusado")
+    return sessao
+
+
+@contextmanager
+def servidor_local(nome, workers, porta, diretorio, ambiente=None):
+    """
+    Sobe o gunicorn no modo informado enquanto o bloco estiver ativo
+
+    Args:
+        nome (str): Chave de SERVIDORES ('wsgi' ou 'asgi')
+        workers (int): Workers do gunicorn
+        porta (int): Porta local
+        diretorio (str): Diretório do projeto
+        ambiente (dict): Variáveis de ambiente do servidor
+
+    Yields:
+        str: Endereço base do servidor
+    """
+    endereco = f'127.0.0.1:{porta}'
+    comando = [sys.executable, '-m', 'gunicorn', *SERVIDORES[nome],
+               '-w', str(workers), '-b', endereco, '--log-level', 'warning']
+    processo = subprocess.Popen(comando, env=ambiente or dict(os.environ), cwd=diretorio)
+    try:
+        if not aguardar_porta('127.0.0.1', porta):
+            raise RuntimeError(f'O servidor {nome} não respondeu em {endereco}')
+        yield f'http://{endereco}'
+    finally:
+        processo.terminate()
+        processo.wait()
+
+
+def semear_dados(municipios, anos, anos_previsao=(2025, 2026), tamanho_lote=5000, semente=0):
+    """
+    Grava municípios sintéticos com histórico, previsões e métricas
+
+    Os municípios usam códigos a partir de CODIGO_SINTETICO_INICIAL e são
+    recriados a cada chamada, sem tocar nos dados reais.
+
+    Args:
+        municipios (int): Quantidade de municípios
+        anos (range): Anos do histórico
+        anos_previsao (tuple): Anos com previsão
+        tamanho_lote (int): Linhas por INSERT
+        semente (int): Semente do gerador aleatório
+
+    Returns:
+        dict: Linhas gravadas por tabela
+    """
+    from django.db import transaction
+    from .models import Municipio, DadosEvasao, PrevisaoEvasao, MetricasModelo
+
+    gerador = np.random.default_rng(semente)
+    ufs = list(UFS_SINTETICAS)
+    anos = list(anos)
+
+    # Passeio aleatório em torno de um nível por município, limitado a 0-100
+    niveis = gerador.uniform(1, 15, size=(municipios, 1))
+    passos = gerador.normal(0, 0.8, size=(municipios, len(anos) + len(anos_previsao)))
+    series = np.clip(niveis + np.cumsum(passos, axis=1), 0, 100)
+    historico, futuro = series[:, :len(anos)], series[:, len(anos):]
+
+    with transaction.atomic():
+        limpar_dados_sinteticos()
+
+        objetos = []
+        for i in range(municipios):
+            uf = ufs[i % len(ufs)]
+            objetos.append(Municipio(codigo=CODIGO_SINTETICO_INICIAL + i, nome=f'Município Sintético {i + 1}',
+                                     uf=uf, regiao=UFS_SINTETICAS[uf]))
+        criados = Municipio.objects.bulk_create(objetos, batch_size=tamanho_lote)
+        if any(municipio.pk is None for municipio in criados):
+            # Bancos que não devolvem as chaves no bulk_create
+            criados = list(Municipio.objects.filter(codigo__gte=CODIGO_SINTETICO_INICIAL).order_by('codigo'))
+
+        DadosEvasao.objects.bulk_create((
+            DadosEvasao(municipio=municipio, ano=ano, total=float(historico[i, j]),
+                        serie_1=float(historico[i, j] * 0.8), serie_2=float(historico[i, j] * 1.1),
+                        serie_3=float(historico[i, j] * 1.2), serie_4=None, nao_seriado=None)
+            for i, municipio in enumerate(criados) for j, ano in enumerate(anos)
+        ), batch_size=tamanho_lote)
+
+        PrevisaoEvasao.objects.bulk_create((
+            PrevisaoEvasao(municipio=municipio, ano=ano, previsao=float(futuro[i, j]),
+                           limite_inferior=float(futuro[i, j] - 1.5), limite_superior=float(futuro[i, j] + 1.5))
+            for i, municipio in enumerate(criados) for j, ano in enumerate(anos_previsao)
+        ), batch_size=tamanho_lote)
+
+        erros = gerador.gamma(2.0, 0.6, size=municipios)
+        MetricasModelo.objects.bulk_create((
+            MetricasModelo(municipio=municipio, mae=float(erros[i]), rmse=float(erros[i] * 1.25),
+                           mape=float(erros[i] / max(historico[i, -1], 0.1) * 100))
+            for i, municipio in enumerate(criados)
+        ), batch_size=tamanho_lote)
+
+    return {
+        'municipios': municipios,
+        'dados_evasao': municipios * len(anos),
+        'previsoes': municipios * len(anos_previsao),
+        'metricas': municipios,
+    }
+
+
+def limpar_dados_sinteticos():
+    """Remove os municípios sintéticos (e, em cascata, seus dados)"""
+    from .models import Municipio
+
+    Municipio.objects.filter(codigo__gte=CODIGO_SINTETICO_INICIAL).delete()
+
+
+def aguardar_porta(host, porta, tempo_limite=30.0):
+    """Espera até que um servidor aceite conexões em host:porta"""
+    limite = time.monotonic() + tempo_limite
+    while time.monotonic() < limite:
+        try:
+            with socket.create_connection((host, porta), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def resumir_latencias(latencias, duracao, erros):
+    """
+    Resume as latências de um conjunto de requisições
+
+    Args:
+        latencias (list): Latências em segundos das requisições bem-sucedidas
+        duracao (float): Tempo total da rodada em segundos
+        erros (int): Número de requisições com erro
+
+    Returns:
+        dict: Vazão e percentis de latência em milissegundos
+    """
+    amostras = np.array(latencias) * 1000
+    percentis = np.percentile(amostras, [50, 90, 95, 99]) if len(amostras) else [np.nan] * 4
+    return {
+        'requisicoes': len(latencias) + erros,
+        'erros': erros,
+        'duracao_s': round(duracao, 3),
+        'vazao_rps': round(len(latencias) / duracao, 2) if duracao > 0 else 0.0,
+        'latencia_ms': {
+            'p50': round(float(percentis[0]), 2),
+            'p90': round(float(percentis[1]), 2),
+            'p95': round(float(percentis[2]), 2),
+            'p99': round(float(percentis[3]), 2),
+            'max': round(float(amostras.max()), 2) if len(amostras) else None,
+        },
+    }
+
+
+def executar_carga(url_base, caminhos, concorrencia, requisicoes, cookies=None, tempo_limite=30.0):
+    """
+    Dispara requisições com concorrência fixa e mede vazão e latência
+
+    Cada um dos `concorrencia` clientes percorre os caminhos em rodízio até
+    que o total de requisições seja atingido.
+
+    Args:
+        url_base (str): Endereço do servidor (ex.: http://127.0.0.1:8000)
+        caminhos (list): Caminhos a requisitar
+        concorrencia (int): Número de clientes simultâneos
+        requisicoes (int): Total de requisições
+        cookies (dict): Cookies enviados em todas as requisições
+        tempo_limite (float): Tempo limite de cada requisição em segundos
+
+    Returns:
+        dict: Resumo geral e por caminho
+    """
+    cabecalhos = {}
+    if cookies:
+        cabecalhos['Cookie'] = '; '.join(f'{nome}={valor}' for nome, valor in cookies.items())
+
+    proxima = iter(range(requisicoes))
+    trava = threading.Lock()
+    resultados = {caminho: {'latencias': [], 'erros': 0} for caminho in caminhos}
+
+    def cliente():
+        while True:
+            with trava:
+                indice = next(proxima, None)
+            if indice is None:
+                return
+
+            caminho = caminhos[indice % len(caminhos)]
+            pedido = urllib.request.Request(url_base.rstrip('/') + caminho, headers=cabecalhos)
+            inicio = time.perf_counter()
+            try:
+                with _abrir(pedido, timeout=tempo_limite) as resposta:
+                    resposta.read()
+                    sucesso = resposta.status == 200
+            except (urllib.error.URLError, OSError):
+                sucesso = False
+            latencia = time.perf_counter() - inicio
+
+            with trava:
+                if sucesso:
+                    resultados[caminho]['latencias'].append(latencia)
+                else:
+                    resultados[caminho]['erros'] += 1
+
+    inicio = time.perf_counter()
+    clientes = [threading.Thread(target=cliente) for _ in range(concorrencia)]
+    for thread in clientes:
+        thread.start()
+    for thread in clientes:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+
+    todas = [latencia for r in resultados.values() for latencia in r['latencias']]
+    erros = sum(r['erros'] for r in resultados.values())
+    resumo = resumir_latencias(todas, duracao, erros)
+    resumo['concorrencia'] = concorrencia
+    resumo['por_caminho'] = {
+        caminho: resumir_latencias(r['latencias'], duracao, r['erros']) for caminho, r in resultados.items()
+    }
+    return resumo
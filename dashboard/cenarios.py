@@ -0,0 +1,310 @@
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from .prophet_pipeline import (criar_modelo, prever, datas_anuais, ANOS_PREVISAO, AMOSTRAS_INCERTEZA_PADRAO,
+                               MODO_SIMULACAO)
+
+# Modos de simulação de cenários
+MODO_APROXIMADO = 'aproximado'
+MODO_COMPLETO = 'completo'
+
+# Número máximo de cenários mantidos em memória (os menos usados são descartados)
+TAMANHO_CACHE = getattr(settings, 'CENARIOS_CACHE_TAMANHO', 256)
+
+
+def interpretar_ajustes(valores):
+    """
+    Converte ajustes no formato 'ano:percentual' (ex.: '2024:-10') em uma chave imutável
+
+    Args:
+        valores (iterable): Textos 'ano:percentual', separados por vírgula ou repetidos
+
+    Returns:
+        tuple: Pares (ano, percentual) ordenados por ano
+    """
+    ajustes = {}
+    for valor in valores:
+        for item in valor.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            try:
+                ano, percentual = item.split(':')
+                ajustes[int(ano)] = float(percentual)
+            except ValueError:
+                raise ValueError(f"Ajuste inválido '{item}'. Use o formato ano:percentual, ex.: 2024:-10")
+
+    if not ajustes:
+        raise ValueError("Informe ao menos um ajuste no formato ano:percentual")
+
+    return tuple(sorted(ajustes.items()))
+
+
+def _historico_ajustado(codigo, ajustes):
+    """Carrega o histórico do município e aplica os ajustes percentuais"""
+    from .models import DadosEvasao
+
+    historico = list(DadosEvasao.objects.filter(municipio__codigo=codigo).order_by('ano').values_list('ano', 'total'))
+    if not historico:
+        raise ValueError(f"Nenhum dado histórico para o município {codigo}")
+
+    anos = np.array([ano for ano, _ in historico])
+    valores = np.array([total for _, total in historico], dtype=float)
+
+    fatores = np.ones_like(valores)
+    for ano, percentual in ajustes:
+        if ano not in anos:
+            raise ValueError(f"O município {codigo} não tem dado observado em {ano}")
+        fatores[anos == ano] = 1 + percentual / 100
+
+    return anos, valores, valores * fatores
+
+
+def versao_dados():
+    """
+    Identifica a versão dos dados gravados, para compor a chave do cache
+
+    O cache vive em cada processo do servidor, então limpar o cache no
+    processo do processamento não alcança os workers. Em vez disso, a chave
+    inclui a execução mais recente e seus contadores, que mudam a cada shard
+    gravado; cenários calculados sobre dados antigos deixam de ser usados.
+    """
+    from .models import ExecucaoProcessamento
+
+    return ExecucaoProcessamento.objects.order_by('-pk').values_list(
+        'pk', 'municipios_processados', 'municipios_com_falha'
+    ).first()
+
+
+def _deslocamentos(anos, diferencas, anos_alvo):
+    """
+    Projeta por mínimos quadrados a diferença entre séries ajustadas e originais
+
+    Vetorizado sobre as linhas: cada linha é um município e anos sem
+    observação ficam como NaN, fora do ajuste. Equivale a np.polyfit de grau 1
+    por linha; com um único ano observado o deslocamento é constante.
+
+    Args:
+        anos (ndarray): Anos das colunas
+        diferencas (ndarray): Matriz municípios x anos (NaN onde não há dado)
+        anos_alvo (array): Anos a projetar
+
+    Returns:
+        ndarray: Deslocamentos municípios x anos_alvo
+    """
+    observado = ~np.isnan(diferencas)
+    x = np.where(observado, anos[np.newaxis, :].astype(float), 0.0)
+    y = np.where(observado, diferencas, 0.0)
+    n = np.maximum(observado.sum(axis=1, keepdims=True), 1)
+
+    media_x = x.sum(axis=1, keepdims=True) / n
+    media_y = y.sum(axis=1, keepdims=True) / n
+    dx = np.where(observado, x - media_x, 0.0)
+    variancia = (dx ** 2).sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        inclinacao = np.where(variancia > 0, (dx * (y - media_y)).sum(axis=1, keepdims=True) / variancia, 0.0)
+
+    return media_y + inclinacao * (np.asarray(anos_alvo, dtype=float)[np.newaxis, :] - media_x)
+
+
+def _simular_aproximado(codigo, anos, valores, valores_ajustados):
+    """
+    Desloca a previsão já gravada pelo efeito do ajuste em uma tendência linear
+
+    A diferença entre a série ajustada e a original é projetada por mínimos
+    quadrados até os anos de previsão. Como a projeção é linear, não é preciso
+    reajustar o Prophet, e a resposta sai em milissegundos.
+    """
+    from .models import PrevisaoEvasao
+
+    base = list(PrevisaoEvasao.objects.filter(municipio__codigo=codigo, ano__in=ANOS_PREVISAO).order_by('ano'))
+    if not base:
+        raise ValueError(f"O município {codigo} não tem previsão gravada; use o modo {MODO_COMPLETO}")
+
+    diferenca = (valores_ajustados - valores)[np.newaxis, :]
+    deslocamentos = _deslocamentos(anos, diferenca, [p.ano for p in base])[0]
+
+    return tuple(
+        {
+            'ano': p.ano,
+            'previsao_base': p.previsao,
+            'previsao': p.previsao + deslocamento,
+            'limite_inferior': p.limite_inferior + deslocamento,
+            'limite_superior': p.limite_superior + deslocamento,
+        }
+        for p, deslocamento in zip(base, deslocamentos)
+    )
+
+
+def _simular_completo(anos, valores_ajustados, amostras_incerteza, modo_intervalo):
+    """Reajusta o Prophet na série ajustada e prevê os anos futuros"""
+    dados_treino = pd.DataFrame({
+        'ds': pd.to_datetime([f'{ano}-12-31' for ano in anos]),
+        'y': valores_ajustados
+    })
+
+    modelo = criar_modelo(amostras_incerteza, modo_intervalo)
+    modelo.fit(dados_treino)
+    previsao = prever(modelo, datas_anuais(ANOS_PREVISAO), modo_intervalo)
+
+    return tuple(
+        {
+            'ano': row['ds'].year,
+            'previsao': row['yhat'],
+            'limite_inferior': row['yhat_lower'],
+            'limite_superior': row['yhat_upper'],
+        }
+        for _, row in previsao.iterrows()
+    )
+
+
+@lru_cache(maxsize=TAMANHO_CACHE)
+def _simular(codigo, config, ajustes, versao):
+    """Simula um cenário; o resultado fica em cache LRU por (código, configuração, ajustes, versão dos dados)"""
+    modo, amostras_incerteza, modo_intervalo = config
+    anos, valores, valores_ajustados = _historico_ajustado(codigo, ajustes)
+
+    if modo != MODO_COMPLETO:
+        return _simular_aproximado(codigo, anos, valores, valores_ajustados)
+
+    # A previsão gravada vem de um treino só até 2023 (e pode ser do ensemble ou do
+    # modelo alternativo); a base é o mesmo reajuste sem os ajustes, também em cache,
+    # para que a diferença seja atribuível apenas aos ajustes
+    cenario = _simular_completo(anos, valores_ajustados, amostras_incerteza, modo_intervalo)
+    base = _simular(codigo, config, (), versao) if ajustes else cenario
+    return tuple(
+        dict(previsao, previsao_base=referencia['previsao']) for previsao, referencia in zip(cenario, base)
+    )
+
+
+def simular_cenario(codigo, ajustes, modo=MODO_APROXIMADO, amostras_incerteza=AMOSTRAS_INCERTEZA_PADRAO,
+                    modo_intervalo=MODO_SIMULACAO):
+    """
+    Refaz a previsão de um município com observações ajustadas
+
+    Args:
+        codigo (int): Código do município
+        ajustes (tuple): Pares (ano, percentual), como retornado por interpretar_ajustes
+        modo (str): 'aproximado' (sem reajuste) ou 'completo' (reajusta o Prophet)
+        amostras_incerteza (int): Simulações usadas nos intervalos (modo completo)
+        modo_intervalo (str): 'simulacao' ou 'analitico' (modo completo)
+
+    Returns:
+        list: Previsões por ano com intervalos e a previsão sem ajustes (previsao_base):
+            a gravada no modo aproximado, o reajuste da série original no modo completo
+    """
+    if modo not in (MODO_APROXIMADO, MODO_COMPLETO):
+        raise ValueError(f"Modo inválido '{modo}'. Use '{MODO_APROXIMADO}' ou '{MODO_COMPLETO}'")
+
+    config = (modo, amostras_incerteza, modo_intervalo)
+    # Cópias, para que quem chama não altere o conteúdo do cache
+    return [dict(previsao) for previsao in _simular(int(codigo), config, tuple(ajustes), versao_dados())]
+
+
+def simular_regiao(ajustes, regiao=None, uf=None, modo=MODO_APROXIMADO):
+    """
+    Aplica os mesmos ajustes a todos os municípios de uma região ou UF
+
+    Histórico e previsões da região são lidos de uma só vez, e o deslocamento
+    de todos os municípios é calculado em uma única operação vetorizada.
+
+    Args:
+        ajustes (tuple): Pares (ano, percentual)
+        regiao (str): Nome da região (ex.: 'Sudeste')
+        uf (str): Sigla da UF
+        modo (str): Apenas 'aproximado' é aceito para regiões
+
+    Returns:
+        dict: Previsões por município, média por ano e municípios ignorados
+    """
+    from .models import Municipio, DadosEvasao, PrevisaoEvasao
+
+    if modo != MODO_APROXIMADO:
+        raise ValueError(f"Cenários por região aceitam apenas o modo '{MODO_APROXIMADO}'")
+
+    filtros = {}
+    if regiao:
+        filtros['regiao'] = regiao
+    if uf:
+        filtros['uf'] = uf.upper()
+
+    nomes = dict(Municipio.objects.filter(**filtros).order_by('nome').values_list('codigo', 'nome'))
+    filtros_relacionados = {f'municipio__{campo}': valor for campo, valor in filtros.items()}
+    historico = pd.DataFrame.from_records(
+        DadosEvasao.objects.filter(**filtros_relacionados).values_list('municipio__codigo', 'ano', 'total'),
+        columns=['codigo', 'ano', 'total']
+    )
+    previsoes = pd.DataFrame.from_records(
+        PrevisaoEvasao.objects.filter(ano__in=ANOS_PREVISAO, **filtros_relacionados).values_list(
+            'municipio__codigo', 'ano', 'previsao', 'limite_inferior', 'limite_superior'),
+        columns=['codigo', 'ano', 'previsao', 'limite_inferior', 'limite_superior']
+    )
+
+    ignorados = {}
+    if historico.empty:
+        series = pd.DataFrame(dtype=float)
+    else:
+        series = historico.pivot_table(index='codigo', columns='ano', values='total', aggfunc='mean')
+    for codigo in nomes.keys() - set(series.index):
+        ignorados[codigo] = f"Nenhum dado histórico para o município {codigo}"
+
+    # Fator de cada ano: 1 sem ajuste; municípios sem o ano ajustado ficam de fora
+    fatores = pd.DataFrame(1.0, index=series.index, columns=series.columns)
+    for ano, percentual in ajustes:
+        sem_ano = series.index if ano not in series.columns else series.index[series[ano].isna()]
+        for codigo in sem_ano:
+            ignorados.setdefault(codigo, f"O município {codigo} não tem dado observado em {ano}")
+        if ano in series.columns:
+            fatores[ano] = 1 + percentual / 100
+
+    sem_previsao = set(series.index) - set(previsoes['codigo'])
+    for codigo in sem_previsao:
+        ignorados.setdefault(codigo, f"O município {codigo} não tem previsão gravada; use o modo {MODO_COMPLETO}")
+
+    validos = [codigo for codigo in series.index if codigo not in ignorados and codigo in nomes]
+    if not validos:
+        raise ValueError("Nenhum município da região pôde ser simulado")
+
+    valores = series.loc[validos].to_numpy(dtype=float)
+    diferencas = valores * fatores.loc[validos].to_numpy() - valores
+    anos_previsao = sorted(previsoes['ano'].unique())
+    deslocamentos = pd.DataFrame(
+        _deslocamentos(series.columns.to_numpy(), diferencas, anos_previsao),
+        index=validos, columns=anos_previsao
+    ).stack().rename('deslocamento')
+
+    previsoes = previsoes[previsoes['codigo'].isin(validos)].join(deslocamentos, on=['codigo', 'ano'])
+    for coluna in ('previsao', 'limite_inferior', 'limite_superior'):
+        previsoes[coluna] = previsoes[coluna] + previsoes['deslocamento']
+    previsoes = previsoes.sort_values(['codigo', 'ano'])
+
+    por_municipio = {}
+    colunas = ['codigo', 'ano', 'previsao', 'limite_inferior', 'limite_superior']
+    for codigo, ano, previsao, inferior, superior in previsoes[colunas].to_numpy().tolist():
+        por_municipio.setdefault(int(codigo), []).append(
+            {'ano': int(ano), 'previsao': previsao, 'limite_inferior': inferior, 'limite_superior': superior}
+        )
+    media = previsoes.groupby('ano')['previsao'].mean()
+
+    return {
+        'municipios': [
+            {'codigo': codigo, 'nome': nome, 'previsoes': por_municipio[codigo]}
+            for codigo, nome in nomes.items() if codigo in por_municipio
+        ],
+        'media': [{'ano': int(ano), 'previsao': float(valor)} for ano, valor in media.items()],
+        'ignorados': [
+            {'codigo': codigo, 'nome': nome, 'motivo': ignorados[codigo]}
+            for codigo, nome in nomes.items() if codigo in ignorados
+        ],
+    }
+
+
+def limpar_cache_cenarios():
+    """
+    Descarta os cenários em cache deste processo
+
+    Só libera memória: a validade entre processos é garantida pela versão dos
+    dados na chave do cache (versao_dados).
+    """
+    _simular.cache_clear()
@@ -1,13 +1,30 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 import numpy as np
-from prophet import Prophet
 from sklearn.metrics import mean_absolute_error, mean_squared_error
-from django.db import transaction
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from .prophet_pipeline import (criar_modelo, prever, FUTURO_PADRAO, ANO_VALIDACAO, AMOSTRAS_INCERTEZA_PADRAO,
+                               MODO_SIMULACAO)
+from .ensemble import prever_membros_simples, calcular_pesos, combinar_ensemble, MEMBRO_PROPHET, MEMBROS
+from .similaridade import construir_indice
+from .qualidade import verificar_qualidade, municipios_sinalizados, prever_fallback
+from .leitura import ler_linhas, montar_filtros, particionar_por_municipio, TAMANHO_CHUNK_PADRAO
 import logging
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+CAMINHO_ARQUIVO_PADRAO = 'base_sp_abandono.xlsx'
+UFS_TODAS = 'todas'
+TAMANHO_SHARD_PADRAO = 50
+
+# Conexão própria do processamento: sem limite de tempo por consulta e com lotes maiores
+BANCO_INGESTAO = 'ingestao'
+
 
 def calcular_metricas(y_true, y_pred):
     mae = mean_absolute_error(y_true, y_pred)
@@ -16,193 +33,711 @@ def calcular_metricas(y_true, y_pred):
     return {'mae': mae, 'rmse': rmse, 'mape': mape}
 
 
-@transaction.atomic
-def processar_dados_evasao():
+def modelar_municipio(codigo, dados_municipio, amostras_incerteza=AMOSTRAS_INCERTEZA_PADRAO,
+                      modo_intervalo=MODO_SIMULACAO, usar_fallback=False):
+    """
+    Treina o modelo e calcula previsões e métricas de um município, sem acessar o banco
+
+    Args:
+        codigo (int): Código do município
+        dados_municipio (DataFrame): Linhas filtradas do município
+        amostras_incerteza (int): Simulações usadas nos intervalos (modo simulação)
+        modo_intervalo (str): 'simulacao' ou 'analitico'
+        usar_fallback (bool): Usar o modelo alternativo barato em vez do Prophet
+
+    Returns:
+        dict: Resultado pronto para salvar_municipio, ou None se não houver dados suficientes
+    """
+    if len(dados_municipio) == 0:
+        return None
+
+    # Obter informações do município
+    info_municipio = dados_municipio.iloc[0]
+    nome_municipio = info_municipio['Nome do Município']
+    regiao = info_municipio['Região']
+
+    print(f"\n📊 Processando {nome_municipio} ({codigo}) - {len(dados_municipio)} registros")
+    print(f"📅 Anos disponíveis: {sorted(dados_municipio['Ano'].tolist())}")
+
+    # Preparar dados para o Prophet
+    dados_prophet = pd.DataFrame({
+        'ds': pd.to_datetime(dados_municipio['Ano'].astype(str) + '-12-31'),
+        'y': dados_municipio['Total']
+    })
+
+    # Separar dados de treino (até 2023) e validação (2024 se existir)
+    dados_treino = dados_prophet[dados_prophet['ds'] < '2024-01-01']
+    dados_validacao = dados_prophet[dados_prophet['ds'] >= '2024-01-01']
+
+    if len(dados_treino) < 3:  # Mínimo de dados para treino
+        print(f"❌ Dados insuficientes para treino: {len(dados_treino)} registros")
+        return None
+
+    print(f"🔧 Treino: {len(dados_treino)} anos (até 2023), Validação: {len(dados_validacao)} anos (2024)")
+
+    print(f"📅 Fazendo previsão para anos: {[d.year for d in FUTURO_PADRAO['ds']]}")
+
+    if usar_fallback:
+        # Série sinalizada na verificação de qualidade: não vale o custo do Prophet
+        print(f"⚠️  Série sinalizada na verificação de qualidade, usando modelo alternativo")
+        previsao = prever_fallback(dados_treino, FUTURO_PADRAO)
+    else:
+        # Treinar modelo Prophet com dados até 2023
+        modelo = criar_modelo(amostras_incerteza, modo_intervalo)
+
+        modelo.fit(dados_treino)
+
+        # Fazer previsão para 2024 (se necessário para métricas) e 2025-2026 em um único predict
+        previsao = prever(modelo, FUTURO_PADRAO, modo_intervalo)
+
+    # Debug: verificar o que foi previsto
+    print(f"🔍 Previsões geradas:")
+    for _, row in previsao.iterrows():
+        print(f"   {row['ds'].year}: {row['yhat']:.2f}% ({row['yhat_lower']:.2f}% - {row['yhat_upper']:.2f}%)")
+
+    # Calcular métricas apenas se houver dados reais de 2024
+    metricas = None
+    if not dados_validacao.empty:
+        # Filtrar previsão para 2024
+        previsao_2024 = previsao[previsao['ds'].dt.year == 2024]
+
+        if not previsao_2024.empty:
+            y_true = dados_validacao['y'].values
+            y_pred = previsao_2024['yhat'].values
+
+            # Verificar se os valores são válidos para cálculo
+            if len(y_true) > 0 and len(y_pred) > 0 and not np.isnan(y_true).any() and not np.isnan(
+                    y_pred).any():
+                try:
+                    metricas = calcular_metricas(y_true, y_pred)
+                    print(f"📈 Métricas para {nome_municipio}:")
+                    print(f"   MAE={metricas['mae']:.3f}%")
+                    print(f"   RMSE={metricas['rmse']:.3f}%")
+                    print(f"   MAPE={metricas['mape']:.1f}%")
+                except Exception as e:
+                    print(f"❌ Erro ao calcular métricas: {str(e)}")
+            else:
+                print(f"⚠️  Valores inválidos para cálculo de métricas")
+    else:
+        print(f"⚠️  Sem dados de 2024 para cálculo de métricas")
+
+    return {
+        'codigo': codigo,
+        'nome': nome_municipio,
+        'uf': info_municipio['UF'],
+        'regiao': regiao,
+        'dados_municipio': dados_municipio,
+        'dados_treino': dados_treino,
+        'dados_validacao': dados_validacao,
+        'usou_fallback': usar_fallback,
+        'previsao': previsao,
+        'metricas': metricas,
+    }
+
+
+def salvar_municipio(resultado):
+    """
+    Grava município, histórico, previsões e métricas calculados por modelar_municipio
+
+    Args:
+        resultado (dict): Resultado de modelar_municipio
+    """
     # Importar modelos aqui para evitar circular imports
-    from .models import Municipio, DadosEvasao, PrevisaoEvasao, MetricasModelo
-
-    # Carregar a base de dados
-    caminho_arquivo = 'base_sp_abandono.xlsx'
-
-    try:
-        dados = pd.read_excel(caminho_arquivo)
-        print(f"✅ Arquivo carregado com sucesso!")
-        print(f"📊 Colunas encontradas: {dados.columns.tolist()}")
-
-    except Exception as e:
-        logger.error(f"❌ Erro ao carregar arquivo: {str(e)}")
+    from .models import Municipio, DadosEvasao, PrevisaoEvasao, MetricasModelo, PrevisaoMembroEnsemble
+
+    dados_municipio = resultado['dados_municipio']
+    previsao = resultado['previsao']
+    metricas = resultado['metricas']
+    nome_municipio = resultado['nome']
+
+    tamanho_lote = settings.INGESTAO_TAMANHO_LOTE
+
+    # Criar ou atualizar registro do município
+    municipio, created = Municipio.objects.using(BANCO_INGESTAO).get_or_create(
+        codigo=resultado['codigo'],
+        defaults={
+            'nome': nome_municipio,
+            'uf': resultado['uf'],
+            'regiao': resultado['regiao']
+        }
+    )
+
+    # Salvar dados históricos em um único upsert; em anos repetidos vale a última linha
+    DadosEvasao.objects.using(BANCO_INGESTAO).bulk_create(
+        [
+            DadosEvasao(
+                municipio=municipio,
+                ano=row['Ano'],
+                total=row['Total'],
+                serie_1=row.get('1ªsérie', None),
+                serie_2=row.get('2ªsérie', None),
+                serie_3=row.get('3ªsérie', None),
+                serie_4=row.get('4ªsérie', None),
+                nao_seriado=row.get('Não-Seriado', None)
+            )
+            for _, row in dados_municipio.drop_duplicates('Ano', keep='last').iterrows()
+        ],
+        batch_size=tamanho_lote,
+        update_conflicts=True,
+        unique_fields=['municipio', 'ano'],
+        update_fields=['total', 'serie_1', 'serie_2', 'serie_3', 'serie_4', 'nao_seriado']
+    )
+
+    # Salvar previsões para 2025 e 2026 (2024 fica só para as métricas)
+    PrevisaoEvasao.objects.using(BANCO_INGESTAO).bulk_create(
+        [
+            PrevisaoEvasao(
+                municipio=municipio,
+                ano=row['ds'].year,
+                previsao=row['yhat'],
+                limite_inferior=row['yhat_lower'],
+                limite_superior=row['yhat_upper']
+            )
+            for _, row in previsao.iterrows() if row['ds'].year >= 2025
+        ],
+        batch_size=tamanho_lote,
+        update_conflicts=True,
+        unique_fields=['municipio', 'ano'],
+        update_fields=['previsao', 'limite_inferior', 'limite_superior']
+    )
+
+    # Salvar previsões de cada membro do ensemble, com o peso usado na combinação;
+    # membros de uma execução anterior que não entraram nesta são removidos
+    membros = resultado.get('membros', {})
+    PrevisaoMembroEnsemble.objects.using(BANCO_INGESTAO).filter(municipio=municipio).exclude(
+        modelo__in=list(membros)
+    ).delete()
+    if membros:
+        PrevisaoMembroEnsemble.objects.using(BANCO_INGESTAO).bulk_create(
+            [
+                PrevisaoMembroEnsemble(
+                    municipio=municipio,
+                    ano=row['ds'].year,
+                    modelo=membro,
+                    previsao=row['yhat'],
+                    limite_inferior=row['yhat_lower'],
+                    limite_superior=row['yhat_upper'],
+                    peso=resultado['pesos'][membro]
+                )
+                for membro, previsao_membro in membros.items()
+                for _, row in previsao_membro.iterrows() if row['ds'].year >= 2025
+            ],
+            batch_size=tamanho_lote,
+            update_conflicts=True,
+            unique_fields=['municipio', 'ano', 'modelo'],
+            update_fields=['previsao', 'limite_inferior', 'limite_superior', 'peso']
+        )
+
+    # Salvar métricas apenas se calculadas
+    if metricas:
+        MetricasModelo.objects.using(BANCO_INGESTAO).update_or_create(
+            municipio=municipio,
+            defaults={
+                'mae': metricas['mae'],
+                'rmse': metricas['rmse'],
+                'mape': metricas['mape']
+            }
+        )
+
+    print(f"✅ Município {nome_municipio} processado com sucesso")
+
+
+def preparar_membros(resultados):
+    """
+    Calcula os membros do ensemble de um lote de municípios
+
+    Os membros baratos são calculados de uma só vez para o lote e o Prophet
+    reaproveita a previsão já feita em modelar_municipio. Aqui os ajustes do
+    Prophet não são paralelizados dentro do shard: no processamento o paralelismo
+    é por UF (processar_dados_evasao); o ajuste em paralelo por município fica
+    no EvasaoProphetPipeline.processar_ensemble.
+
+    Municípios que usaram o modelo alternativo ficam fora do ensemble e mantêm
+    a previsão do fallback: os membros baratos seriam ajustados sobre a mesma
+    série anômala da qual o fallback os protege.
+
+    Args:
+        resultados (list): Resultados de modelar_municipio (alterados no lugar)
+    """
+    resultados = [r for r in resultados if r is not None and not r['usou_fallback']]
+    if not resultados:
         return
 
-    # Converter colunas numéricas que podem ter '--' para NaN
-    colunas_numericas = ['Total', '1ªsérie', '2ªsérie', '3ªsérie', '4ªsérie', 'Não-Seriado']
-
-    for coluna in colunas_numericas:
-        if coluna in dados.columns:
-            if dados[coluna].dtype == 'object':
-                # Substituir '--' por NaN e converter para float
-                dados[coluna] = dados[coluna].replace('--', np.nan)
-                dados[coluna] = pd.to_numeric(dados[coluna], errors='coerce')
-                print(f"✅ Coluna {coluna} convertida para numérico")
-
-    # Remover linhas com valores NaN na coluna Total
-    dados = dados.dropna(subset=['Total'])
-    print(f"📋 Dados após remover NaN: {len(dados)} registros")
+    membros = prever_membros_simples({r['codigo']: r['dados_treino'] for r in resultados}, FUTURO_PADRAO)
+    for resultado in resultados:
+        resultado['membros'] = {membro: previsoes[resultado['codigo']] for membro, previsoes in membros.items()}
+        resultado['membros'][MEMBRO_PROPHET] = resultado['previsao']
+
+
+def _agrupar_membros(resultados):
+    """Reúne os membros dos resultados em membro -> (código -> previsão)"""
+    membros = {}
+    for resultado in resultados:
+        for membro, previsao in resultado['membros'].items():
+            membros.setdefault(membro, {})[resultado['codigo']] = previsao
+    return membros
+
+
+def calcular_pesos_ensemble(resultados, excluir_dos_pesos=frozenset()):
+    """
+    Pesos do ensemble pelo erro em 2024 de todos os municípios informados
+
+    É chamado uma vez por UF, depois de todos os shards modelados, para que
+    municípios vizinhos sejam combinados com os mesmos pesos.
+
+    Args:
+        resultados (list): Resultados com os membros de preparar_membros
+        excluir_dos_pesos (set): Códigos que não entram no cálculo dos pesos
+            (ex.: sinalizados na verificação de qualidade, cujo 2024 distorceria o erro)
+
+    Returns:
+        dict: Membro -> peso; vazio se nenhum município tiver membros
+    """
+    resultados = [r for r in resultados if r is not None and r.get('membros')]
+    if not resultados:
+        return {}
+
+    y_validacao = {
+        r['codigo']: r['dados_validacao']['y'].mean() for r in resultados
+        if not r['dados_validacao'].empty and r['codigo'] not in excluir_dos_pesos
+    }
+    return calcular_pesos(_agrupar_membros(resultados), y_validacao, FUTURO_PADRAO, ANO_VALIDACAO)
+
+
+def aplicar_ensemble(resultados, pesos):
+    """
+    Substitui as previsões de um lote de municípios pelo ensemble dos membros
+
+    Args:
+        resultados (list): Resultados com os membros de preparar_membros (alterados no lugar)
+        pesos (dict): Membro -> peso, de calcular_pesos_ensemble
+    """
+    resultados = [r for r in resultados if r is not None and r.get('membros')]
+    if not resultados or not pesos:
+        return
 
-    # Filtrar apenas para SP e dados totais
-    try:
-        dados_sp = dados[(dados['UF'] == 'SP')].copy()
+    for resultado in resultados:
+        # Membros sem peso (ex.: pesos reaproveitados de uma execução retomada) não são combinados nem gravados
+        resultado['membros'] = {membro: previsao for membro, previsao in resultado['membros'].items()
+                                if membro in pesos}
+    membros = _agrupar_membros(resultados)
+    combinados = combinar_ensemble({membro: membros.get(membro, {}) for membro in pesos}, pesos, FUTURO_PADRAO)
+
+    for resultado in resultados:
+        previsao = combinados[resultado['codigo']]
+        resultado['previsao'] = previsao
+        resultado['pesos'] = pesos
+
+        if not resultado['dados_validacao'].empty:
+            y_true = np.array([resultado['dados_validacao']['y'].mean()])
+            y_pred = previsao.loc[previsao['ds'].dt.year == ANO_VALIDACAO, 'yhat'].values
+            resultado['metricas'] = calcular_metricas(y_true, y_pred)
+
+
+def _pesos_gravados(execucao_id, uf):
+    """
+    Pesos do ensemble já usados na UF por uma execução retomada
+
+    Os shards restantes são combinados com os mesmos pesos dos já gravados, em
+    vez de pesos calculados só sobre os municípios que faltam.
+    """
+    from .models import PrevisaoMembroEnsemble, RegistroMunicipioExecucao
+
+    concluidos = RegistroMunicipioExecucao.objects.using(BANCO_INGESTAO).filter(
+        execucao_id=execucao_id, uf=uf, status=RegistroMunicipioExecucao.STATUS_PROCESSADO
+    ).values('codigo')
+    pesos = dict(
+        PrevisaoMembroEnsemble.objects.using(BANCO_INGESTAO).filter(municipio__codigo__in=concluidos)
+        .values_list('modelo', 'peso').distinct()
+    )
+    return {membro: pesos[membro] for membro in MEMBROS if membro in pesos}
+
+
+def _inicializar_worker():
+    """Prepara o Django em cada processo filho, sem herdar conexões do pai"""
+    import django
+    from django.db import connections
+
+    django.setup()
+    connections.close_all()
+
+
+def _atualizar_contadores(execucao_id):
+    """Recalcula os totais da execução a partir do relatório por município"""
+    from .models import ExecucaoProcessamento, RegistroMunicipioExecucao
+
+    registros = RegistroMunicipioExecucao.objects.using(BANCO_INGESTAO).filter(execucao_id=execucao_id)
+    ExecucaoProcessamento.objects.using(BANCO_INGESTAO).filter(pk=execucao_id).update(
+        municipios_processados=registros.filter(status=RegistroMunicipioExecucao.STATUS_PROCESSADO).count(),
+        municipios_com_falha=registros.filter(status=RegistroMunicipioExecucao.STATUS_FALHA).count(),
+    )
+
+
+def modelar_shard(particoes, fallback_anomalias=False, ensemble=False, **config_previsao):
+    """
+    Verifica a qualidade e ajusta os modelos de um shard, sem acessar o banco
+
+    Todas as séries do shard passam juntas pela verificação de qualidade antes
+    do ajuste, que acontece fora de qualquer transação para não segurar locks.
+
+    Args:
+        particoes (list): Pares (código, DataFrame) dos municípios do shard
+        fallback_anomalias (bool): Usar o modelo alternativo nos municípios sinalizados
+        ensemble (bool): Calcular os membros do ensemble (combinados depois, com os pesos da UF)
+        **config_previsao: Opções repassadas a modelar_municipio
+
+    Returns:
+        tuple: (problemas de qualidade, trincas (código, resultado, erro))
+    """
+    # Verificação de qualidade vetorizada sobre todas as séries do shard
+    problemas = verificar_qualidade(pd.concat([dados for _, dados in particoes], ignore_index=True))
+    sinalizados = municipios_sinalizados(problemas) if fallback_anomalias else frozenset()
+    if not problemas.empty:
+        print(f"🔎 Verificação de qualidade: {len(problemas)} problemas em "
+              f"{problemas['codigo'].nunique()} municípios")
+
+    resultados = []
+    for codigo, dados_municipio in particoes:
+        try:
+            resultado = modelar_municipio(codigo, dados_municipio, usar_fallback=codigo in sinalizados,
+                                          **config_previsao)
+            resultados.append((codigo, resultado, None))
+        except Exception as e:
+            resultados.append((codigo, None, e))
 
-        # Verificar se as colunas de filtro existem
-        if 'Localização' in dados_sp.columns:
-            dados_sp = dados_sp[dados_sp['Localização'] == 'Total']
-        if 'Dependência Administrativa' in dados_sp.columns:
-            dados_sp = dados_sp[dados_sp['Dependência Administrativa'] == 'Total']
+    if ensemble:
+        preparar_membros([resultado for _, resultado, _ in resultados])
 
-        print(f"✅ Dados filtrados: {len(dados_sp)} registros")
+    return problemas, resultados
 
-    except Exception as e:
-        logger.error(f"Erro ao filtrar dados: {str(e)}")
-        return
 
-    # Processar cada município
-    municipios_processados = 0
-    for codigo in dados_sp['Código do Município'].unique():
-        try:
-            # Filtrar dados do município
-            dados_municipio = dados_sp[dados_sp['Código do Município'] == codigo].copy()
+def gravar_shard(execucao_id, uf, numero_shard, particoes, problemas, resultados):
+    """
+    Grava um shard já modelado em uma única transação
 
-            if len(dados_municipio) == 0:
-                continue
+    Cada município tem seu próprio savepoint: uma falha desfaz apenas aquele
+    município e fica registrada no relatório da execução, sem abortar o
+    restante do shard.
 
-            # Obter informações do município
-            info_municipio = dados_municipio.iloc[0]
-            nome_municipio = info_municipio['Nome do Município']
-            regiao = info_municipio['Região']
+    Args:
+        execucao_id (int): Execução à qual o shard pertence
+        uf (str): Sigla da UF do shard
+        numero_shard (int): Número sequencial do shard dentro da UF
+        particoes (list): Pares (código, DataFrame) dos municípios do shard
+        problemas (DataFrame): Problemas de qualidade de modelar_shard
+        resultados (list): Trincas (código, resultado, erro) de modelar_shard
 
-            print(f"\n📊 Processando {nome_municipio} ({codigo}) - {len(dados_municipio)} registros")
-            print(f"📅 Anos disponíveis: {sorted(dados_municipio['Ano'].tolist())}")
+    Returns:
+        int: Número de municípios processados
+    """
+    from .models import RegistroMunicipioExecucao, ProblemaQualidade
 
-            # Criar ou atualizar registro do município
-            municipio, created = Municipio.objects.get_or_create(
+    municipios_processados = 0
+    with transaction.atomic(using=BANCO_INGESTAO):
+        # Problemas de uma tentativa anterior (execução retomada) são substituídos
+        ProblemaQualidade.objects.using(BANCO_INGESTAO).filter(
+            execucao_id=execucao_id, codigo__in=[codigo for codigo, _ in particoes]
+        ).delete()
+        ProblemaQualidade.objects.using(BANCO_INGESTAO).bulk_create([
+            ProblemaQualidade(
+                execucao_id=execucao_id,
+                codigo=problema.codigo,
+                ano=problema.ano,
+                tipo=problema.tipo,
+                valor=None if pd.isna(problema.valor) else float(problema.valor),
+                detalhe=problema.detalhe
+            )
+            for problema in problemas.itertuples(index=False)
+        ], batch_size=settings.INGESTAO_TAMANHO_LOTE)
+
+        for codigo, resultado, erro in resultados:
+            status = RegistroMunicipioExecucao.STATUS_IGNORADO
+            if erro is None and resultado is not None:
+                try:
+                    # Savepoint por município
+                    with transaction.atomic(using=BANCO_INGESTAO):
+                        salvar_municipio(resultado)
+                    status = RegistroMunicipioExecucao.STATUS_PROCESSADO
+                    municipios_processados += 1
+                except Exception as e:
+                    erro = e
+
+            if erro is not None:
+                status = RegistroMunicipioExecucao.STATUS_FALHA
+                logger.error(f"❌ Erro ao processar município {codigo}: {str(erro)}")
+                print(f"❌ Erro ao processar município {codigo}: {str(erro)}")
+
+            RegistroMunicipioExecucao.objects.using(BANCO_INGESTAO).update_or_create(
+                execucao_id=execucao_id,
                 codigo=codigo,
                 defaults={
-                    'nome': nome_municipio,
-                    'uf': 'SP',
-                    'regiao': regiao
+                    'uf': uf,
+                    'shard': numero_shard,
+                    'status': status,
+                    'mensagem': str(erro) if erro is not None else ''
                 }
             )
 
-            # Preparar dados para o Prophet
-            dados_prophet = pd.DataFrame({
-                'ds': pd.to_datetime(dados_municipio['Ano'].astype(str) + '-12-31'),
-                'y': dados_municipio['Total']
-            })
+        _atualizar_contadores(execucao_id)
 
-            # Separar dados de treino (até 2023) e validação (2024 se existir)
-            dados_treino = dados_prophet[dados_prophet['ds'] < '2024-01-01']
-            dados_validacao = dados_prophet[dados_prophet['ds'] >= '2024-01-01']
+    print(f"💾 Shard {numero_shard} da UF {uf} gravado: {len(particoes)} municípios")
+    return municipios_processados
 
-            if len(dados_treino) < 3:  # Mínimo de dados para treino
-                print(f"❌ Dados insuficientes para treino: {len(dados_treino)} registros")
-                continue
 
-            print(f"🔧 Treino: {len(dados_treino)} anos (até 2023), Validação: {len(dados_validacao)} anos (2024)")
+def processar_particao_uf(rotulo, particoes, execucao_id, tamanho_shard=TAMANHO_SHARD_PADRAO,
+                          ja_registrados=frozenset(), ensemble=False, **config_previsao):
+    """
+    Processa os municípios de uma partição em shards de tamanho fixo
 
-            # Treinar modelo Prophet com dados até 2023
-            modelo = Prophet(
-                yearly_seasonality=True,
-                seasonality_mode='multiplicative',
-                changepoint_prior_scale=0.05,
-                seasonality_prior_scale=10
-            )
+    Cada shard contém municípios de uma única UF, tirada dos próprios dados do
+    município; uma partição com várias UFs (processamento serial) mantém um
+    shard aberto por UF. Com ensemble, os shards são modelados à medida que
+    enchem, mas só são gravados depois que a UF inteira foi modelada: os pesos
+    são calculados uma vez sobre todos os municípios da UF.
 
-            modelo.fit(dados_treino)
-
-            # Fazer previsão para 2024 (se necessário para métricas) e 2025-2026
-            futuro = pd.DataFrame({
-                'ds': pd.to_datetime(['2024-12-31', '2025-12-31', '2026-12-31'])
-            })
-
-            print(f"📅 Fazendo previsão para anos: {[d.year for d in futuro['ds']]}")
-
-            previsao = modelo.predict(futuro)
-
-            # Debug: verificar o que foi previsto
-            print(f"🔍 Previsões geradas:")
-            for _, row in previsao.iterrows():
-                print(f"   {row['ds'].year}: {row['yhat']:.2f}% ({row['yhat_lower']:.2f}% - {row['yhat_upper']:.2f}%)")
-
-            # Calcular métricas apenas se houver dados reais de 2024
-            metricas = None
-            if not dados_validacao.empty:
-                # Filtrar previsão para 2024
-                previsao_2024 = previsao[previsao['ds'].dt.year == 2024]
-
-                if not previsao_2024.empty:
-                    y_true = dados_validacao['y'].values
-                    y_pred = previsao_2024['yhat'].values
-
-                    # Verificar se os valores são válidos para cálculo
-                    if len(y_true) > 0 and len(y_pred) > 0 and not np.isnan(y_true).any() and not np.isnan(
-                            y_pred).any():
-                        try:
-                            metricas = calcular_metricas(y_true, y_pred)
-                            print(f"📈 Métricas para {nome_municipio}:")
-                            print(f"   MAE={metricas['mae']:.3f}%")
-                            print(f"   RMSE={metricas['rmse']:.3f}%")
-                            print(f"   MAPE={metricas['mape']:.1f}%")
-                        except Exception as e:
-                            print(f"❌ Erro ao calcular métricas: {str(e)}")
-                    else:
-                        print(f"⚠️  Valores inválidos para cálculo de métricas")
-            else:
-                print(f"⚠️  Sem dados de 2024 para cálculo de métricas")
+    Args:
+        rotulo (str): Rótulo da partição, usado apenas nas mensagens
+        particoes (iterable): Pares (código, DataFrame) dos municípios
+        execucao_id (int): Execução à qual os shards pertencem
+        tamanho_shard (int): Municípios gravados por transação
+        ja_registrados (set): Códigos já concluídos em uma execução retomada
+        ensemble (bool): Combinar o Prophet com os membros baratos do ensemble
+        **config_previsao: Opções repassadas a modelar_shard
 
-            # Salvar dados históricos
-            for _, row in dados_municipio.iterrows():
-                DadosEvasao.objects.update_or_create(
-                    municipio=municipio,
-                    ano=row['Ano'],
-                    defaults={
-                        'total': row['Total'],
-                        'serie_1': row.get('1ªsérie', None),
-                        'serie_2': row.get('2ªsérie', None),
-                        'serie_3': row.get('3ªsérie', None),
-                        'serie_4': row.get('4ªsérie', None),
-                        'nao_seriado': row.get('Não-Seriado', None)
-                    }
-                )
+    Returns:
+        int: Número de municípios processados
+    """
+    from .models import RegistroMunicipioExecucao
 
-            # Salvar previsões para 2025 e 2026 (e 2024 se necessário)
-            for _, row in previsao.iterrows():
-                ano = row['ds'].year
-                if ano >= 2025:  # Salvar apenas previsões futuras
-                    PrevisaoEvasao.objects.update_or_create(
-                        municipio=municipio,
-                        ano=ano,
-                        defaults={
-                            'previsao': row['yhat'],
-                            'limite_inferior': row['yhat_lower'],
-                            'limite_superior': row['yhat_upper']
-                        }
-                    )
-
-            # Salvar métricas apenas se calculadas
-            if metricas:
-                MetricasModelo.objects.update_or_create(
-                    municipio=municipio,
-                    defaults={
-                        'mae': metricas['mae'],
-                        'rmse': metricas['rmse'],
-                        'mape': metricas['mape']
-                    }
-                )
-
-            municipios_processados += 1
-            print(f"✅ Município {nome_municipio} processado com sucesso")
+    print(f"\n🗺️  Processando {rotulo}")
+    municipios_processados = 0
+    shards = {}
+    numeros_shard = {}
+    # Shards modelados que aguardam os pesos do ensemble da UF
+    modelados = {}
+
+    def gravar(uf, particoes_shard, problemas, resultados):
+        if uf not in numeros_shard:
+            # Ao retomar, a numeração continua a partir do último shard gravado da UF
+            numeros_shard[uf] = RegistroMunicipioExecucao.objects.using(BANCO_INGESTAO).filter(
+                execucao_id=execucao_id, uf=uf
+            ).aggregate(ultimo=Max('shard'))['ultimo'] or 0
+        numeros_shard[uf] += 1
+        return gravar_shard(execucao_id, uf, numeros_shard[uf], particoes_shard, problemas, resultados)
+
+    def fechar_shard(uf):
+        particoes_shard = shards.pop(uf)
+        problemas, resultados = modelar_shard(particoes_shard, ensemble=ensemble, **config_previsao)
+        if ensemble:
+            modelados.setdefault(uf, []).append((particoes_shard, problemas, resultados))
+            return 0
+        return gravar(uf, particoes_shard, problemas, resultados)
+
+    for codigo, dados_municipio in particoes:
+        if codigo in ja_registrados:
+            continue
+        uf = dados_municipio['UF'].iloc[0]
+        shards.setdefault(uf, []).append((codigo, dados_municipio))
+        if len(shards[uf]) >= tamanho_shard:
+            municipios_processados += fechar_shard(uf)
+
+    for uf in list(shards):
+        municipios_processados += fechar_shard(uf)
+
+    for uf, lotes in modelados.items():
+        pesos = _pesos_gravados(execucao_id, uf) or calcular_pesos_ensemble(
+            [resultado for _, _, resultados in lotes for _, resultado, _ in resultados],
+            excluir_dos_pesos=frozenset().union(*(municipios_sinalizados(problemas) for _, problemas, _ in lotes))
+        )
+        print(f"🧮 Pesos do ensemble da UF {uf}: " +
+              ', '.join(f"{membro}={peso:.2f}" for membro, peso in pesos.items()))
+        for particoes_shard, problemas, resultados in lotes:
+            aplicar_ensemble([resultado for _, resultado, _ in resultados], pesos)
+            municipios_processados += gravar(uf, particoes_shard, problemas, resultados)
+
+    return municipios_processados
+
+
+def _rotulo_ufs(ufs):
+    """Texto gravado em ExecucaoProcessamento.ufs"""
+    return ','.join(sorted(uf.upper() for uf in ufs)) if ufs is not None else UFS_TODAS
+
+
+def _divergencias_execucao(execucao, caminho_arquivo, ufs, tamanho_shard, opcoes_modelo):
+    """Parâmetros atuais que diferem dos gravados na execução a retomar"""
+    esperado = dict(opcoes_modelo, arquivo=str(caminho_arquivo), ufs=_rotulo_ufs(ufs), shard=tamanho_shard)
+    gravado = {
+        'arquivo': execucao.arquivo,
+        # Execuções antigas gravavam as UFs na ordem informada
+        'ufs': execucao.ufs if execucao.ufs == UFS_TODAS else _rotulo_ufs(execucao.ufs.split(',')),
+        'shard': execucao.tamanho_shard,
+    }
+    gravado.update({nome: getattr(execucao, nome) for nome in opcoes_modelo})
+    # As amostras só importam no modo simulação
+    if esperado['modo_intervalo'] != MODO_SIMULACAO and gravado['modo_intervalo'] != MODO_SIMULACAO:
+        del esperado['amostras_incerteza']
+    return [
+        f"{nome}: {gravado[nome]} != {esperado[nome]}" for nome in esperado
+        # Opções nulas: execução gravada antes de as opções serem registradas
+        if gravado[nome] is not None and gravado[nome] != esperado[nome]
+    ]
+
+
+def _iniciar_execucao(caminho_arquivo, ufs, tamanho_shard, opcoes_modelo, retomar=False, execucao_id=None):
+    """
+    Cria uma execução nova ou recupera uma execução interrompida
+
+    Args:
+        caminho_arquivo (str): Arquivo de entrada
+        ufs (iterable): UFs processadas; None para todas
+        tamanho_shard (int): Municípios gravados por transação
+        opcoes_modelo (dict): modo_intervalo, amostras_incerteza, ensemble e fallback_anomalias
+        retomar (bool): Retomar uma execução não concluída
+        execucao_id (int): Execução a retomar (padrão: a mais recente não concluída)
+
+    Returns:
+        tuple: (execução, códigos já concluídos que devem ser pulados)
+    """
+    from .models import ExecucaoProcessamento, RegistroMunicipioExecucao
+
+    if retomar:
+        execucoes = ExecucaoProcessamento.objects.using(BANCO_INGESTAO).filter(
+            status=ExecucaoProcessamento.STATUS_EM_ANDAMENTO
+        )
+        if execucao_id is not None:
+            execucoes = execucoes.filter(pk=execucao_id)
+        execucao = execucoes.order_by('-iniciada_em').first()
+
+        if execucao is not None:
+            # Uma execução só é retomada com a mesma entrada e as mesmas opções de modelagem,
+            # para o relatório não misturar bases nem configurações
+            divergencias = _divergencias_execucao(execucao, caminho_arquivo, ufs, tamanho_shard, opcoes_modelo)
+            if divergencias:
+                raise ValueError(f"A execução {execucao.pk} foi iniciada com parâmetros diferentes "
+                                 f"({'; '.join(divergencias)}). Repita os parâmetros originais ou "
+                                 f"inicie uma nova execução sem --retomar.")
+
+            # Falhas são tentadas novamente; municípios concluídos ou ignorados são pulados
+            ja_registrados = frozenset(
+                execucao.registros.exclude(status=RegistroMunicipioExecucao.STATUS_FALHA)
+                .values_list('codigo', flat=True)
+            )
+            print(f"🔁 Retomando execução {execucao.pk}: {len(ja_registrados)} municípios já concluídos")
+            return execucao, ja_registrados
+
+        print(f"⚠️  Nenhuma execução em andamento para retomar, iniciando uma nova")
+
+    execucao = ExecucaoProcessamento.objects.using(BANCO_INGESTAO).create(
+        arquivo=str(caminho_arquivo),
+        ufs=_rotulo_ufs(ufs),
+        tamanho_shard=tamanho_shard,
+        **opcoes_modelo
+    )
+    return execucao, frozenset()
+
+
+def processar_dados_evasao(caminho_arquivo=CAMINHO_ARQUIVO_PADRAO, ufs=('SP',), workers=None,
+                           tamanho_chunk=TAMANHO_CHUNK_PADRAO, ordenado=False,
+                           amostras_incerteza=AMOSTRAS_INCERTEZA_PADRAO, modo_intervalo=MODO_SIMULACAO,
+                           tamanho_shard=TAMANHO_SHARD_PADRAO, retomar=False, execucao_id=None,
+                           fallback_anomalias=False, ensemble=False):
+    """
+    Lê a base em streaming e processa os municípios particionados por UF
+
+    Os filtros (UF, Localização e Dependência Administrativa) são aplicados na
+    leitura, então linhas descartadas nunca chegam a ocupar memória. Com uma única
+    UF (ou um único worker) os municípios são processados à medida que são lidos;
+    com várias UFs, cada UF vira uma partição independente processada em paralelo.
+    As gravações são confirmadas a cada shard, e o progresso fica registrado em
+    ExecucaoProcessamento para que uma execução interrompida possa ser retomada.
+
+    Args:
+        caminho_arquivo (str): Caminho para o arquivo .xlsx ou .csv
+        ufs (iterable): Siglas das UFs a processar; None processa todas
+        workers (int): Número de processos paralelos (padrão: número de CPUs)
+        tamanho_chunk (int): Linhas por bloco na leitura de CSV
+        ordenado (bool): Se o arquivo está ordenado por município
+        amostras_incerteza (int): Simulações usadas nos intervalos (modo simulação)
+        modo_intervalo (str): 'simulacao' ou 'analitico'
+        tamanho_shard (int): Municípios gravados por transação
+        retomar (bool): Retomar a última execução não concluída
+        execucao_id (int): Execução específica a retomar
+        fallback_anomalias (bool): Usar um modelo alternativo barato nos municípios
+            sinalizados pela verificação de qualidade
+        ensemble (bool): Combinar o Prophet com ingênuo, deriva, Holt e tendência
+            linear, ponderados pelo erro em 2024 de todos os municípios da UF
+
+    Returns:
+        ExecucaoProcessamento: Execução com o relatório do processamento
+    """
+    from .models import ExecucaoProcessamento
+
+    workers = workers or os.cpu_count() or 1
 
-        except Exception as e:
-            logger.error(f"❌ Erro ao processar município {codigo}: {str(e)}")
-            print(f"❌ Erro ao processar município {codigo}: {str(e)}")
+    try:
+        linhas = ler_linhas(caminho_arquivo, montar_filtros(ufs), tamanho_chunk=tamanho_chunk)
+        print(f"✅ Arquivo aberto para leitura em streaming!")
 
-    print(f"\n🎉 Processamento concluído! {municipios_processados} municípios processados.")
\ No newline at end of file
+    except Exception as e:
+        logger.error(f"❌ Erro ao carregar arquivo: {str(e)}")
+        return None
+
+    opcoes_modelo = {
+        'modo_intervalo': modo_intervalo,
+        'amostras_incerteza': amostras_incerteza,
+        'ensemble': ensemble,
+        'fallback_anomalias': fallback_anomalias,
+    }
+    execucao, ja_registrados = _iniciar_execucao(caminho_arquivo, ufs, tamanho_shard, opcoes_modelo, retomar,
+                                                 execucao_id)
+    opcoes = dict(opcoes_modelo, execucao_id=execucao.pk, tamanho_shard=tamanho_shard,
+                  ja_registrados=ja_registrados)
+
+    particoes = particionar_por_municipio(linhas, ordenado=ordenado)
+    ufs_com_erro = []
+
+    if workers == 1 or (ufs is not None and len(ufs) == 1):
+        rotulo = 'UF ' + ', '.join(ufs) if ufs is not None else 'todas as UFs'
+        processar_particao_uf(rotulo, particoes, **opcoes)
+    else:
+        # Agrupar as partições por UF (apenas linhas já filtradas ficam em memória)
+        particoes_por_uf = {}
+        for codigo, dados_municipio in particoes:
+            particoes_por_uf.setdefault(dados_municipio['UF'].iloc[0], []).append((codigo, dados_municipio))
+
+        # As maiores UFs primeiro, para equilibrar a carga entre os processos
+        ordem = sorted(particoes_por_uf, key=lambda uf: len(particoes_por_uf[uf]), reverse=True)
+
+        # Os processos filhos abrem suas próprias conexões
+        connections.close_all()
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(ordem) or 1),
+                                 initializer=_inicializar_worker) as executor:
+            futuros = {executor.submit(processar_particao_uf, f'UF {uf}', particoes_por_uf[uf], **opcoes): uf
+                       for uf in ordem}
+            for futuro in as_completed(futuros):
+                uf = futuros[futuro]
+                try:
+                    print(f"✅ UF {uf} concluída: {futuro.result()} municípios processados")
+                except Exception as e:
+                    ufs_com_erro.append(uf)
+                    logger.error(f"❌ Erro ao processar UF {uf}: {str(e)}")
+                    print(f"❌ Erro ao processar UF {uf}: {str(e)}")
+
+    _atualizar_contadores(execucao.pk)
+    execucao.refresh_from_db()
+
+    # Uma UF interrompida mantém a execução em andamento, para ser retomada
+    if ufs_com_erro:
+        print(f"⚠️  UFs interrompidas: {', '.join(ufs_com_erro)}. Use --retomar para continuar.")
+    else:
+        execucao.status = ExecucaoProcessamento.STATUS_CONCLUIDA
+        execucao.finalizada_em = timezone.now()
+        execucao.save(update_fields=['status', 'finalizada_em'])
+
+    # O índice cobre todos os municípios do banco, não apenas os desta execução
+    construir_indice(using=BANCO_INGESTAO)
+
+    print(f"\n🎉 Processamento concluído! {execucao.municipios_processados} municípios processados, "
+          f"{execucao.municipios_com_falha} com falha (execução {execucao.pk}).")
+    return execucao
@@ -0,0 +1,211 @@
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+
+# Membros do ensemble
+MEMBRO_INGENUO = 'ingenuo'
+MEMBRO_DERIVA = 'deriva'
+MEMBRO_HOLT = 'holt'
+MEMBRO_TENDENCIA_LINEAR = 'tendencia_linear'
+MEMBRO_PROPHET = 'prophet'
+
+MEMBROS_SIMPLES = (MEMBRO_INGENUO, MEMBRO_DERIVA, MEMBRO_HOLT, MEMBRO_TENDENCIA_LINEAR)
+MEMBROS = MEMBROS_SIMPLES + (MEMBRO_PROPHET,)
+
+# Suavização de Holt com parâmetros fixos (sem otimização, para manter o custo baixo)
+HOLT_ALFA = 0.8
+HOLT_BETA = 0.2
+
+# Evita peso infinito quando um membro acerta exatamente a validação
+EPSILON_ERRO = 1e-6
+
+
+def _montar_matriz(treinos):
+    """
+    Empilha as séries de treino em uma matriz municípios x anos
+
+    Anos faltantes no meio da série são interpolados; nas pontas, repetidos.
+
+    Args:
+        treinos (dict): Código -> DataFrame de treino (ds, y)
+
+    Returns:
+        tuple: (códigos, anos, matriz de valores)
+    """
+    codigos = list(treinos)
+    series = pd.DataFrame({
+        codigo: dados.groupby(dados['ds'].dt.year)['y'].mean() for codigo, dados in treinos.items()
+    }).T.sort_index(axis=1)
+    series = series.reindex(index=codigos, columns=range(int(series.columns.min()), int(series.columns.max()) + 1))
+    series = series.interpolate(axis=1, limit_direction='both')
+    return codigos, series.columns.to_numpy(), series.to_numpy(dtype=float)
+
+
+def _desvio(residuos, graus_liberdade=1):
+    """Desvio-padrão por linha, ignorando NaN, com no mínimo zero"""
+    n = np.sum(~np.isnan(residuos), axis=1)
+    soma = np.nansum(residuos ** 2, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        desvio = np.sqrt(soma / np.maximum(n - graus_liberdade, 1))
+    return np.nan_to_num(desvio)
+
+
+def prever_membros_simples(treinos, futuro, interval_width=0.8):
+    """
+    Calcula de uma só vez as previsões dos membros baratos para todos os municípios
+
+    Ingênuo, deriva, Holt e tendência linear são calculados com operações
+    vetorizadas sobre a matriz municípios x anos, sem laço por município.
+
+    Args:
+        treinos (dict): Código -> DataFrame de treino (ds, y)
+        futuro (DataFrame): Datas a prever (coluna ds)
+        interval_width (float): Cobertura dos intervalos, como no Prophet
+
+    Returns:
+        dict: Membro -> (código -> DataFrame com ds, yhat, yhat_lower, yhat_upper)
+    """
+    if not treinos:
+        return {membro: {} for membro in MEMBROS_SIMPLES}
+
+    codigos, anos, y = _montar_matriz(treinos)
+    n_anos = y.shape[1]
+    anos_futuro = futuro['ds'].dt.year.to_numpy()
+    h = (anos_futuro - anos[-1])[np.newaxis, :].astype(float)
+    z = NormalDist().inv_cdf(0.5 + interval_width / 2)
+    ultimo = y[:, [-1]]
+
+    previsoes = {}
+
+    # Ingênuo: repete o último valor
+    variacoes = np.diff(y, axis=1)
+    sigma = _desvio(variacoes)[:, np.newaxis]
+    previsoes[MEMBRO_INGENUO] = (np.repeat(ultimo, h.shape[1], axis=1), z * sigma * np.sqrt(h))
+
+    # Deriva: última observação mais a variação média
+    if n_anos > 1:
+        inclinacao = (y[:, [-1]] - y[:, [0]]) / (n_anos - 1)
+    else:
+        inclinacao = np.zeros_like(ultimo)
+    sigma = _desvio(variacoes - inclinacao, graus_liberdade=2)[:, np.newaxis]
+    previsoes[MEMBRO_DERIVA] = (ultimo + h * inclinacao, z * sigma * np.sqrt(h))
+
+    # Holt: nível e tendência com suavização exponencial
+    nivel = y[:, 0].copy()
+    tendencia = y[:, 1] - y[:, 0] if n_anos > 1 else np.zeros(len(codigos))
+    erros = np.full((len(codigos), max(n_anos - 1, 0)), np.nan)
+    for t in range(1, n_anos):
+        erros[:, t - 1] = y[:, t] - (nivel + tendencia)
+        nivel_anterior = nivel
+        nivel = HOLT_ALFA * y[:, t] + (1 - HOLT_ALFA) * (nivel + tendencia)
+        tendencia = HOLT_BETA * (nivel - nivel_anterior) + (1 - HOLT_BETA) * tendencia
+    sigma = _desvio(erros)[:, np.newaxis]
+    previsoes[MEMBRO_HOLT] = (nivel[:, np.newaxis] + h * tendencia[:, np.newaxis], z * sigma * np.sqrt(h))
+
+    # Tendência linear: mínimos quadrados em forma fechada para todas as linhas
+    t = anos - anos.mean()
+    variancia = np.sum(t ** 2)
+    media = y.mean(axis=1, keepdims=True)
+    inclinacao = (y - media) @ t[:, np.newaxis] / variancia if variancia > 0 else np.zeros_like(media)
+    ajustado = media + inclinacao * t[np.newaxis, :]
+    sigma = _desvio(y - ajustado, graus_liberdade=2)[:, np.newaxis]
+    t_futuro = (anos_futuro - anos.mean())[np.newaxis, :]
+    previsoes[MEMBRO_TENDENCIA_LINEAR] = (media + inclinacao * t_futuro, z * sigma * np.ones_like(h))
+
+    datas = futuro['ds'].reset_index(drop=True)
+    resultado = {}
+    for membro, (yhat, margem) in previsoes.items():
+        resultado[membro] = {
+            codigo: pd.DataFrame({
+                'ds': datas,
+                'yhat': yhat[i],
+                'yhat_lower': yhat[i] - margem[i],
+                'yhat_upper': yhat[i] + margem[i],
+            })
+            for i, codigo in enumerate(codigos)
+        }
+    return resultado
+
+
+def _empilhar(membros, codigos, futuro):
+    """Converte membro -> código -> DataFrame em um array (membros, municípios, horizontes, 3)"""
+    datas = futuro['ds'].reset_index(drop=True)
+    empilhado = np.full((len(membros), len(codigos), len(datas), 3), np.nan)
+    for m, previsoes in enumerate(membros.values()):
+        for i, codigo in enumerate(codigos):
+            previsao = previsoes.get(codigo)
+            if previsao is None:
+                continue
+            alinhada = previsao.set_index('ds').reindex(datas)
+            empilhado[m, i] = alinhada[['yhat', 'yhat_lower', 'yhat_upper']].to_numpy(dtype=float)
+    return empilhado
+
+
+def calcular_pesos(membros, y_validacao, futuro, ano_validacao):
+    """
+    Pesos globais dos membros pelo inverso do erro quadrático médio na validação
+
+    O erro de cada membro é medido em todos os municípios do lote ao mesmo tempo.
+    Sem dados de validação, os membros recebem pesos iguais.
+
+    Args:
+        membros (dict): Membro -> (código -> DataFrame de previsão)
+        y_validacao (dict): Código -> valor observado no ano de validação
+        futuro (DataFrame): Datas previstas (coluna ds)
+        ano_validacao (int): Ano usado no backtest
+
+    Returns:
+        dict: Membro -> peso (somam 1)
+    """
+    codigos = list(y_validacao)
+    anos = futuro['ds'].dt.year.to_numpy()
+    if not codigos or ano_validacao not in anos:
+        return {membro: 1 / len(membros) for membro in membros}
+
+    previsto = _empilhar(membros, codigos, futuro)[:, :, list(anos).index(ano_validacao), 0]
+    observado = np.array([y_validacao[codigo] for codigo in codigos], dtype=float)[np.newaxis, :]
+
+    quadrados = (previsto - observado) ** 2
+    contagem = np.sum(~np.isnan(quadrados), axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mse = np.where(contagem > 0, np.nansum(quadrados, axis=1) / contagem, np.nan)
+
+    inverso = np.where(np.isnan(mse), 0.0, 1 / (mse + EPSILON_ERRO))
+    if inverso.sum() == 0:
+        return {membro: 1 / len(membros) for membro in membros}
+    return dict(zip(membros, (inverso / inverso.sum()).tolist()))
+
+
+def combinar_ensemble(membros, pesos, futuro):
+    """
+    Combina as previsões dos membros com os pesos, para todos os municípios de uma vez
+
+    Se um membro não tiver previsão para um município, os pesos dos demais são
+    renormalizados naquele município.
+
+    Args:
+        membros (dict): Membro -> (código -> DataFrame de previsão)
+        pesos (dict): Membro -> peso
+        futuro (DataFrame): Datas previstas (coluna ds)
+
+    Returns:
+        dict: Código -> DataFrame com a previsão do ensemble
+    """
+    codigos = sorted({codigo for previsoes in membros.values() for codigo in previsoes})
+    empilhado = _empilhar(membros, codigos, futuro)
+
+    w = np.array([pesos[membro] for membro in membros])[:, np.newaxis, np.newaxis, np.newaxis]
+    w = np.where(np.isnan(empilhado), 0.0, w)
+    with np.errstate(invalid='ignore'):
+        combinado = np.nansum(empilhado * w, axis=0) / w.sum(axis=0)
+
+    datas = futuro['ds'].reset_index(drop=True)
+    return {
+        codigo: pd.DataFrame({
+            'ds': datas,
+            'yhat': combinado[i, :, 0],
+            'yhat_lower': combinado[i, :, 1],
+            'yhat_upper': combinado[i, :, 2],
+        })
+        for i, codigo in enumerate(codigos)
+    }
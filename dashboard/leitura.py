@@ -0,0 +1,218 @@
+import os
+import numpy as np
+import pandas as pd
+
+COLUNAS_MUNICIPIO = ['Ano', 'Região', 'UF', 'Código do Município', 'Nome do Município']
+COLUNAS_NUMERICAS = ['Total', '1ªsérie', '2ªsérie', '3ªsérie', '4ªsérie', 'Não-Seriado']
+
+# Filtros aplicados já na leitura: coluna -> valores aceitos
+FILTROS_PADRAO = {
+    'UF': frozenset({'SP'}),
+    'Localização': frozenset({'Total'}),
+    'Dependência Administrativa': frozenset({'Total'}),
+}
+
+TAMANHO_CHUNK_PADRAO = 50000
+
+
+def montar_filtros(ufs=None):
+    """
+    Monta os filtros de leitura para um conjunto de UFs
+
+    Args:
+        ufs (iterable): Siglas das UFs aceitas; None aceita todas
+
+    Returns:
+        dict: Coluna -> conjunto de valores aceitos
+    """
+    filtros = dict(FILTROS_PADRAO)
+    if ufs is None:
+        del filtros['UF']
+    else:
+        filtros['UF'] = frozenset(uf.strip().upper() for uf in ufs)
+    return filtros
+
+
+def _para_float(valor):
+    """Converte um valor da planilha para float, tratando '--' e vazios como NaN"""
+    if valor is None:
+        return np.nan
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _normalizar_linha(linha):
+    """
+    Converte os tipos de uma linha já filtrada
+
+    Args:
+        linha (dict): Valores da linha indexados pelo nome da coluna
+
+    Returns:
+        dict: Linha normalizada, ou None se a coluna Total estiver vazia
+    """
+    for coluna in COLUNAS_NUMERICAS:
+        if coluna in linha:
+            linha[coluna] = _para_float(linha[coluna])
+
+    if np.isnan(linha['Total']):
+        return None
+
+    linha['Ano'] = int(linha['Ano'])
+    linha['Código do Município'] = int(linha['Código do Município'])
+    return linha
+
+
+def ler_linhas_excel(caminho_arquivo, filtros=None):
+    """
+    Lê uma planilha linha a linha com o openpyxl em modo somente leitura
+
+    O cabeçalho é lido imediatamente (erros de arquivo aparecem na chamada),
+    e as linhas que não passam nos filtros são descartadas sem serem guardadas.
+
+    Args:
+        caminho_arquivo (str): Caminho para o arquivo Excel
+        filtros (dict): Coluna -> conjunto de valores aceitos
+
+    Returns:
+        generator: Linhas filtradas e normalizadas (dict)
+    """
+    from openpyxl import load_workbook
+
+    filtros = FILTROS_PADRAO if filtros is None else filtros
+    workbook = load_workbook(caminho_arquivo, read_only=True, data_only=True)
+    linhas = workbook.active.iter_rows(values_only=True)
+    cabecalho = [str(celula).strip() if celula is not None else '' for celula in next(linhas, ())]
+    print(f"📊 Colunas encontradas: {cabecalho}")
+
+    indices = {coluna: i for i, coluna in enumerate(cabecalho)}
+    filtros_ativos = [(indices[coluna], aceitos) for coluna, aceitos in filtros.items() if coluna in indices]
+    colunas = [(coluna, indices[coluna]) for coluna in COLUNAS_MUNICIPIO + COLUNAS_NUMERICAS if coluna in indices]
+
+    def valor(valores, i):
+        # Linhas em modo somente leitura podem vir sem as células finais vazias
+        return valores[i] if i < len(valores) else None
+
+    def iterar():
+        try:
+            for valores in linhas:
+                if any(valor(valores, i) not in aceitos for i, aceitos in filtros_ativos):
+                    continue
+                linha = _normalizar_linha({coluna: valor(valores, i) for coluna, i in colunas})
+                if linha is not None:
+                    yield linha
+        finally:
+            workbook.close()
+
+    return iterar()
+
+
+def ler_linhas_csv(caminho_arquivo, filtros=None, tamanho_chunk=TAMANHO_CHUNK_PADRAO, separador=',',
+                   encoding='utf-8'):
+    """
+    Lê um CSV em blocos de tamanho fixo, filtrando cada bloco de forma vetorizada
+
+    Apenas as colunas usadas pelo processamento são carregadas.
+
+    Args:
+        caminho_arquivo (str): Caminho para o arquivo CSV
+        filtros (dict): Coluna -> conjunto de valores aceitos
+        tamanho_chunk (int): Número de linhas lidas por bloco
+        separador (str): Separador de campos do CSV
+        encoding (str): Codificação do arquivo
+
+    Returns:
+        generator: Linhas filtradas e normalizadas (dict)
+    """
+    filtros = FILTROS_PADRAO if filtros is None else filtros
+    colunas_desejadas = set(COLUNAS_MUNICIPIO + COLUNAS_NUMERICAS) | set(filtros)
+
+    leitor = pd.read_csv(
+        caminho_arquivo,
+        sep=separador,
+        encoding=encoding,
+        chunksize=tamanho_chunk,
+        usecols=lambda coluna: coluna.strip() in colunas_desejadas,
+        dtype=str,
+    )
+
+    def iterar():
+        with leitor:
+            for chunk in leitor:
+                chunk.columns = chunk.columns.str.strip()
+
+                mascara = np.ones(len(chunk), dtype=bool)
+                for coluna, aceitos in filtros.items():
+                    if coluna in chunk.columns:
+                        mascara &= chunk[coluna].str.strip().isin(aceitos).to_numpy()
+                chunk = chunk[mascara].copy()
+
+                for coluna in COLUNAS_NUMERICAS:
+                    if coluna in chunk.columns:
+                        chunk[coluna] = pd.to_numeric(chunk[coluna].str.strip().replace('--', np.nan),
+                                                      errors='coerce')
+                chunk = chunk.dropna(subset=['Total'])
+
+                colunas = [coluna for coluna in COLUNAS_MUNICIPIO + COLUNAS_NUMERICAS if coluna in chunk.columns]
+                for linha in chunk[colunas].to_dict('records'):
+                    yield _normalizar_linha(linha)
+
+    return iterar()
+
+
+def ler_linhas(caminho_arquivo, filtros=None, tamanho_chunk=TAMANHO_CHUNK_PADRAO, **kwargs):
+    """
+    Escolhe o leitor em streaming de acordo com a extensão do arquivo
+
+    Args:
+        caminho_arquivo (str): Caminho para o arquivo (.xlsx ou .csv)
+        filtros (dict): Coluna -> conjunto de valores aceitos
+        tamanho_chunk (int): Linhas por bloco na leitura de CSV
+
+    Returns:
+        generator: Linhas filtradas e normalizadas (dict)
+    """
+    extensao = os.path.splitext(caminho_arquivo)[1].lower()
+    if extensao in ('.csv', '.txt'):
+        return ler_linhas_csv(caminho_arquivo, filtros, tamanho_chunk=tamanho_chunk, **kwargs)
+    return ler_linhas_excel(caminho_arquivo, filtros)
+
+
+def particionar_por_municipio(linhas, ordenado=False):
+    """
+    Agrupa as linhas filtradas por município de forma incremental
+
+    Se o arquivo estiver ordenado por município, cada município é entregue assim
+    que o próximo começa, e a memória fica limitada a um município. Caso contrário,
+    apenas as linhas filtradas ficam em memória até o fim da leitura.
+
+    Args:
+        linhas (iterable): Linhas normalizadas (dict)
+        ordenado (bool): Se as linhas de um mesmo município são contíguas
+
+    Yields:
+        tuple: (código do município, DataFrame com as linhas do município)
+
+    Raises:
+        ValueError: Se, com ordenado=True, um município já entregue reaparecer
+    """
+    pendentes = {}
+    entregues = set()
+    codigo_atual = None
+
+    for linha in linhas:
+        codigo = linha['Código do Município']
+        if ordenado and codigo_atual is not None and codigo != codigo_atual:
+            yield codigo_atual, pd.DataFrame(pendentes.pop(codigo_atual))
+            entregues.add(codigo_atual)
+        if codigo in entregues:
+            # Um arquivo ordenado por ano, por exemplo, viraria um fragmento por linha
+            raise ValueError(f"O município {codigo} reapareceu depois de outros municípios: o arquivo não "
+                             f"está agrupado por município. Processe sem --ordenado.")
+        codigo_atual = codigo
+        pendentes.setdefault(codigo, []).append(linha)
+
+    for codigo, registros in pendentes.items():
+        yield codigo, pd.DataFrame(registros)
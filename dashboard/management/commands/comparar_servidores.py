@@ -0,0 +1,54 @@
+import json
+import os
+import secrets
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from dashboard.carga import SERVIDORES, entrar, executar_carga, servidor_local
+
+
+class Command(BaseCommand):
+    help = 'Compara vazão e latência do dashboard servido via WSGI (gunicorn) e ASGI (uvicorn)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servidores', nargs='+', choices=list(SERVIDORES), default=list(SERVIDORES),
+                            help='Modos a comparar')
+        parser.add_argument('--workers', type=int, default=2, help='Workers do gunicorn')
+        parser.add_argument('--concorrencia', type=int, default=16, help='Clientes simultâneos')
+        parser.add_argument('--requisicoes', type=int, default=400, help='Total de requisições por modo')
+        parser.add_argument('--porta', type=int, default=8765, help='Porta local usada pelos servidores')
+        parser.add_argument('--caminhos', nargs='+',
+                            default=['/dashboard/', '/dashboard/api/cenarios/?uf=SP&ajuste=2024:-10'],
+                            help='Caminhos requisitados em rodízio')
+        parser.add_argument('--saida', default=None, help='Arquivo JSON com o relatório')
+
+    def handle(self, *args, **options):
+        # Superusuário descartável, removido ao final, para que caminhos do admin também respondam 200
+        credenciais = (f'carga-{secrets.token_hex(4)}', secrets.token_urlsafe(24))
+        temporario = User.objects.create_superuser(username=credenciais[0], password=credenciais[1])
+
+        # DEBUG=True evita o redirecionamento para HTTPS do perfil de produção
+        ambiente = dict(os.environ, DEBUG='True')
+        relatorio = {}
+
+        try:
+            for nome in options['servidores']:
+                self.stdout.write(f'Iniciando {nome}: {" ".join(SERVIDORES[nome])}')
+                with servidor_local(nome, options['workers'], options['porta'], settings.BASE_DIR,
+                                    ambiente) as url_base:
+                    cookies = entrar(url_base, *credenciais)
+                    # Aquecimento, para não medir a importação dos módulos
+                    executar_carga(url_base, options['caminhos'], options['workers'],
+                                   options['workers'] * len(options['caminhos']), cookies)
+                    relatorio[nome] = executar_carga(url_base, options['caminhos'],
+                                                     options['concorrencia'], options['requisicoes'], cookies)
+        except (RuntimeError, ValueError) as e:
+            raise CommandError(str(e))
+        finally:
+            temporario.delete()
+
+        saida = json.dumps(relatorio, indent=2, ensure_ascii=False)
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                arquivo.write(saida)
+        self.stdout.write(saida)
@@ -0,0 +1,101 @@
+import json
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+# Alias temporário usado em cada perfil medido
+ALIAS_MEDICAO = 'medicao_conexoes'
+
+CONSULTA_PADRAO = 'SELECT COUNT(*) FROM dashboard_municipio'
+
+
+def _perfis(base):
+    """
+    Variações da configuração do banco comparadas na medição
+
+    - sem_reuso: uma conexão nova por requisição (CONN_MAX_AGE=0, sem pool);
+    - persistente: conexão mantida entre requisições, com verificação de saúde;
+    - pool: pool nativo do psycopg (apenas PostgreSQL);
+    - configurado: exatamente o que está em settings.DATABASES['default'].
+    """
+    opcoes = {chave: valor for chave, valor in base.get('OPTIONS', {}).items() if chave != 'pool'}
+    perfis = {
+        'sem_reuso': dict(base, CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False, OPTIONS=opcoes),
+        'persistente': dict(base, CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True, OPTIONS=opcoes),
+    }
+    if base['ENGINE'] == 'django.db.backends.postgresql':
+        perfis['pool'] = dict(base, CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False,
+                              OPTIONS=dict(opcoes, pool={'min_size': 1, 'max_size': 4}))
+    perfis['configurado'] = dict(base)
+    return perfis
+
+
+class Command(BaseCommand):
+    help = ('Mede o custo de conexão por requisição com e sem reuso (persistente ou pool) '
+            'no banco configurado em DATABASE_URL')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requisicoes', type=int, default=500, help='Requisições simuladas por perfil')
+        parser.add_argument('--consulta', default=CONSULTA_PADRAO, help='Consulta feita em cada requisição')
+        parser.add_argument('--saida', default=None, help='Arquivo JSON com o relatório')
+
+    def handle(self, *args, **options):
+        base = connections['default'].settings_dict
+        relatorio = {'banco': connections['default'].vendor, 'requisicoes': options['requisicoes'], 'perfis': {}}
+
+        for nome, configuracao in _perfis(base).items():
+            try:
+                relatorio['perfis'][nome] = self._medir(configuracao, options['requisicoes'], options['consulta'])
+            except Exception as e:
+                raise CommandError(f'Falha no perfil {nome}: {e}')
+
+        sem_reuso = relatorio['perfis']['sem_reuso']['media_ms']
+        for resultado in relatorio['perfis'].values():
+            resultado['economia_ms'] = round(sem_reuso - resultado['media_ms'], 3)
+
+        saida = json.dumps(relatorio, indent=2, ensure_ascii=False)
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                arquivo.write(saida)
+        self.stdout.write(saida)
+
+    def _medir(self, configuracao, requisicoes, consulta):
+        """
+        Simula o ciclo de requisições do Django sobre um alias temporário
+
+        Cada iteração dispara request_started, faz a consulta e dispara
+        request_finished, que fecha a conexão, a mantém aberta ou a devolve ao
+        pool conforme a configuração, exatamente como numa requisição real.
+        """
+        # configure_settings exige o alias 'default' e preenche os valores omitidos
+        connections.settings[ALIAS_MEDICAO] = connections.configure_settings(
+            {'default': dict(connections['default'].settings_dict), ALIAS_MEDICAO: dict(configuracao)}
+        )[ALIAS_MEDICAO]
+        conexao = connections[ALIAS_MEDICAO]
+        tempos = []
+        try:
+            for _ in range(requisicoes):
+                inicio = time.perf_counter()
+                request_started.send(sender=self.__class__)
+                with conexao.cursor() as cursor:
+                    cursor.execute(consulta)
+                    cursor.fetchall()
+                request_finished.send(sender=self.__class__)
+                tempos.append(time.perf_counter() - inicio)
+        finally:
+            conexao.close()
+            if hasattr(conexao, 'close_pool'):
+                conexao.close_pool()
+            del connections[ALIAS_MEDICAO]
+            del connections.settings[ALIAS_MEDICAO]
+
+        amostras = np.array(tempos) * 1000
+        p50, p95, p99 = np.percentile(amostras, [50, 95, 99])
+        return {
+            'media_ms': round(float(amostras.mean()), 3),
+            'p50_ms': round(float(p50), 3),
+            'p95_ms': round(float(p95), 3),
+            'p99_ms': round(float(p99), 3),
+        }
@@ -1,13 +1,69 @@
-from django.core.management.base import BaseCommand
-from dashboard.data_processor import processar_dados_evasao
+from django.core.management.base import BaseCommand, CommandError
+from dashboard.data_processor import (processar_dados_evasao, CAMINHO_ARQUIVO_PADRAO, UFS_TODAS,
+                                      TAMANHO_SHARD_PADRAO)
+from dashboard.leitura import TAMANHO_CHUNK_PADRAO
+from dashboard.prophet_pipeline import AMOSTRAS_INCERTEZA_PADRAO, MODO_SIMULACAO, MODO_ANALITICO
 
 
 class Command(BaseCommand):
     help = 'Processa os dados de evasão escolar e gera previsões'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--arquivo', default=CAMINHO_ARQUIVO_PADRAO,
+                            help='Arquivo de entrada (.xlsx ou .csv)')
+        parser.add_argument('--uf', nargs='+', default=['SP'],
+                            help=f'UFs a processar (ex.: SP RJ MG) ou "{UFS_TODAS}"')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Processos paralelos, um por UF (padrão: número de CPUs)')
+        parser.add_argument('--chunk', type=int, default=TAMANHO_CHUNK_PADRAO,
+                            help='Linhas por bloco na leitura de CSV')
+        parser.add_argument('--ordenado', action='store_true',
+                            help='O arquivo está ordenado por município (reduz a memória usada)')
+        parser.add_argument('--amostras-incerteza', type=int, default=AMOSTRAS_INCERTEZA_PADRAO,
+                            help='Simulações usadas nos intervalos de previsão (mínimo 1 no modo simulação)')
+        parser.add_argument('--intervalo', choices=[MODO_SIMULACAO, MODO_ANALITICO], default=MODO_SIMULACAO,
+                            help='Intervalos por simulação (Prophet) ou analíticos: aproximação por '
+                                 'resíduos do treino, alargada por √(anos à frente)')
+        parser.add_argument('--shard', type=int, default=TAMANHO_SHARD_PADRAO,
+                            help='Municípios gravados por transação')
+        parser.add_argument('--retomar', action='store_true',
+                            help='Retoma a última execução não concluída a partir do último shard gravado')
+        parser.add_argument('--execucao', type=int, default=None,
+                            help='Id da execução a retomar (com --retomar)')
+        parser.add_argument('--fallback-anomalias', action='store_true',
+                            help='Usa um modelo alternativo barato nos municípios sinalizados na verificação de qualidade')
+        parser.add_argument('--ensemble', action='store_true',
+                            help='Combina o Prophet com ingênuo, deriva, Holt e tendência linear, com pesos '
+                                 'calculados sobre toda a UF (o Prophet segue ajustado município a município '
+                                 'em cada shard)')
+
     def handle(self, *args, **options):
+        if options['intervalo'] == MODO_SIMULACAO and options['amostras_incerteza'] < 1:
+            raise CommandError(f"--amostras-incerteza deve ser ao menos 1 no modo '{MODO_SIMULACAO}'; "
+                               f"use --intervalo {MODO_ANALITICO} para dispensar a simulação")
+
+        ufs = options['uf']
+        if any(uf.lower() == UFS_TODAS for uf in ufs):
+            ufs = None
+
         self.stdout.write('Iniciando processamento de dados de evasão...')
-        processar_dados_evasao()
+        try:
+            processar_dados_evasao(
+                caminho_arquivo=options['arquivo'],
+                ufs=ufs,
+                workers=options['workers'],
+                tamanho_chunk=options['chunk'],
+                ordenado=options['ordenado'],
+                amostras_incerteza=options['amostras_incerteza'],
+                modo_intervalo=options['intervalo'],
+                tamanho_shard=options['shard'],
+                retomar=options['retomar'],
+                execucao_id=options['execucao'],
+                fallback_anomalias=options['fallback_anomalias'],
+                ensemble=options['ensemble'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
         self.stdout.write(
             self.style.SUCCESS('Processamento concluído com sucesso!')
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,114 @@
+import json
+import os
+import secrets
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from dashboard.carga import (SERVIDORES, CODIGO_SINTETICO_INICIAL, entrar, executar_carga, limpar_dados_sinteticos,
+                             semear_dados, servidor_local)
+from dashboard.similaridade import construir_indice
+
+# Dashboard, APIs e listagens do admin
+CAMINHOS_PADRAO = [
+    '/dashboard/',
+    '/dashboard/?page=5',
+    '/dashboard/?uf=SP',
+    '/dashboard/api/cenarios/?codigo={codigo}&ajuste=2024:-10',
+    '/dashboard/api/similares/?codigo={codigo}',
+    '/admin/dashboard/municipio/',
+    '/admin/dashboard/dadosevasao/',
+    '/admin/dashboard/previsaoevasao/',
+    '/admin/dashboard/metricasmodelo/',
+]
+
+
+class Command(BaseCommand):
+    help = ('Semeia o banco (SQLite ou PostgreSQL, conforme DATABASE_URL) com dados sintéticos e mede vazão '
+            'e latência do dashboard, das APIs e do admin com concorrência fixa')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--municipios', type=int, default=645, help='Municípios sintéticos a semear')
+        parser.add_argument('--ano-inicial', type=int, default=2007, help='Primeiro ano do histórico sintético')
+        parser.add_argument('--ano-final', type=int, default=2024, help='Último ano do histórico sintético')
+        parser.add_argument('--sem-semear', action='store_true', help='Usa os dados já gravados no banco')
+        parser.add_argument('--manter', action='store_true',
+                            help='Mantém os dados sintéticos semeados (por padrão são removidos ao final)')
+        parser.add_argument('--servidor', choices=list(SERVIDORES), default='wsgi', help='Modo do gunicorn')
+        parser.add_argument('--url', default=None,
+                            help='Servidor já em execução; se omitido, sobe o gunicorn localmente')
+        parser.add_argument('--workers', type=int, default=2, help='Workers do gunicorn')
+        parser.add_argument('--porta', type=int, default=8765, help='Porta local do gunicorn')
+        parser.add_argument('--concorrencia', type=int, default=16, help='Clientes simultâneos')
+        parser.add_argument('--requisicoes', type=int, default=900, help='Total de requisições')
+        parser.add_argument('--caminhos', nargs='+', default=CAMINHOS_PADRAO,
+                            help='Caminhos requisitados em rodízio ({codigo} vira um município semeado)')
+        parser.add_argument('--usuario', default=None,
+                            help='Usuário existente usado no login com --url ou --sem-semear; na rodada semeada '
+                                 'local é criado um superusuário temporário')
+        parser.add_argument('--senha', default=None, help='Senha do usuário informado em --usuario')
+        parser.add_argument('--saida', default=None, help='Arquivo JSON com o relatório')
+
+    def handle(self, *args, **options):
+        relatorio = {'banco': connection.vendor, 'servidor': options['url'] or options['servidor']}
+
+        temporario = None
+        if options['usuario']:
+            if not options['senha']:
+                raise CommandError('Informe --senha junto com --usuario')
+            credenciais = (options['usuario'], options['senha'])
+        elif options['sem_semear'] or options['url']:
+            raise CommandError('Com --url ou --sem-semear, informe --usuario e --senha de uma conta existente')
+        else:
+            # Superusuário descartável, para que as listagens do admin respondam 200
+            credenciais = (f'carga-{secrets.token_hex(4)}', secrets.token_urlsafe(24))
+            temporario = User.objects.create_superuser(username=credenciais[0], password=credenciais[1])
+
+        caminhos = [caminho.format(codigo=CODIGO_SINTETICO_INICIAL) for caminho in options['caminhos']]
+
+        try:
+            if not options['sem_semear']:
+                inicio = time.perf_counter()
+                anos = range(options['ano_inicial'], options['ano_final'] + 1)
+                relatorio['semeadura'] = semear_dados(options['municipios'], anos)
+                construir_indice()
+                relatorio['semeadura']['duracao_s'] = round(time.perf_counter() - inicio, 3)
+                self.stdout.write(f"Semeados {options['municipios']} municípios em "
+                                  f"{relatorio['semeadura']['duracao_s']} s")
+
+            if options['url']:
+                relatorio['resultado'] = self._medir(options['url'], caminhos, credenciais, options)
+            else:
+                # DEBUG=True evita o redirecionamento para HTTPS do perfil de produção
+                ambiente = dict(os.environ, DEBUG='True')
+                with servidor_local(options['servidor'], options['workers'], options['porta'],
+                                    settings.BASE_DIR, ambiente) as url_base:
+                    relatorio['resultado'] = self._medir(url_base, caminhos, credenciais, options)
+        except (RuntimeError, ValueError) as e:
+            raise CommandError(str(e))
+        finally:
+            if temporario is not None:
+                temporario.delete()
+            # Os dados semeados ocupariam o dashboard e o índice do banco configurado
+            if not options['sem_semear'] and not options['manter']:
+                limpar_dados_sinteticos()
+                # O índice foi construído com os códigos sintéticos
+                construir_indice()
+
+        saida = json.dumps(relatorio, indent=2, ensure_ascii=False)
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                arquivo.write(saida)
+        self.stdout.write(saida)
+
+    def _medir(self, url_base, caminhos, credenciais, options):
+        """Faz login pelo formulário, aquece o servidor e mede a carga"""
+        cookies = entrar(url_base, *credenciais)
+
+        # Aquecimento, para não medir a importação dos módulos nem caches vazios
+        executar_carga(url_base, caminhos, options['workers'], options['workers'] * len(caminhos), cookies)
+
+        resultado = executar_carga(url_base, caminhos, options['concorrencia'], options['requisicoes'], cookies)
+        resultado['workers'] = options['workers']
+        return resultado
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 01:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='municipio',
+            name='uf',
+            field=models.CharField(db_index=True, max_length=2),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-19 01:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_municipio_uf_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecucaoProcessamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('arquivo', models.CharField(max_length=255)),
+                ('ufs', models.CharField(max_length=255)),
+                ('tamanho_shard', models.IntegerField()),
+                ('status', models.CharField(choices=[('em_andamento', 'Em andamento'), ('concluida', 'Concluída')], default='em_andamento', max_length=20)),
+                ('municipios_processados', models.IntegerField(default=0)),
+                ('municipios_com_falha', models.IntegerField(default=0)),
+                ('iniciada_em', models.DateTimeField(auto_now_add=True)),
+                ('finalizada_em', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RegistroMunicipioExecucao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.IntegerField()),
+                ('uf', models.CharField(max_length=2)),
+                ('shard', models.IntegerField()),
+                ('status', models.CharField(choices=[('processado', 'Processado'), ('ignorado', 'Ignorado'), ('falha', 'Falha')], max_length=20)),
+                ('mensagem', models.TextField(blank=True)),
+                ('registrado_em', models.DateTimeField(auto_now=True)),
+                ('execucao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registros', to='dashboard.execucaoprocessamento')),
+            ],
+            options={
+                'unique_together': {('execucao', 'codigo')},
+            },
+        ),
+    ]
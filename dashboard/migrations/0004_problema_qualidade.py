@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-19 01:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_execucao_processamento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProblemaQualidade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.IntegerField()),
+                ('ano', models.IntegerField()),
+                ('tipo', models.CharField(choices=[('ano_ausente', 'Ano ausente'), ('fora_da_faixa', 'Fora da faixa'), ('salto', 'Salto'), ('duplicado', 'Duplicado')], max_length=20)),
+                ('valor', models.FloatField(blank=True, null=True)),
+                ('detalhe', models.CharField(blank=True, max_length=255)),
+                ('execucao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='problemas', to='dashboard.execucaoprocessamento')),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-19 01:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_problema_qualidade'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrevisaoMembroEnsemble',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ano', models.IntegerField()),
+                ('modelo', models.CharField(max_length=30)),
+                ('previsao', models.FloatField()),
+                ('limite_inferior', models.FloatField()),
+                ('limite_superior', models.FloatField()),
+                ('peso', models.FloatField()),
+                ('municipio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dashboard.municipio')),
+            ],
+            options={
+                'unique_together': {('municipio', 'ano', 'modelo')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-19 01:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_previsao_membro_ensemble'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceSimilaridade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('municipios', models.IntegerField()),
+                ('vizinhos', models.IntegerField()),
+                ('ano_inicial', models.IntegerField()),
+                ('ano_final', models.IntegerField()),
+                ('codigos', models.BinaryField()),
+                ('indices', models.BinaryField()),
+                ('distancias', models.BinaryField()),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_indice_similaridade'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='execucaoprocessamento',
+            name='amostras_incerteza',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='execucaoprocessamento',
+            name='ensemble',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='execucaoprocessamento',
+            name='fallback_anomalias',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='execucaoprocessamento',
+            name='modo_intervalo',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+    ]
@@ -1,11 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import User
+from .qualidade import TIPO_ANO_AUSENTE, TIPO_FORA_DA_FAIXA, TIPO_SALTO, TIPO_DUPLICADO
 
 
 class Municipio(models.Model):
     codigo = models.IntegerField(unique=True)
     nome = models.CharField(max_length=100)
-    uf = models.CharField(max_length=2)
+    uf = models.CharField(max_length=2, db_index=True)
     regiao = models.CharField(max_length=50)
 
     def __str__(self):
@@ -43,6 +44,37 @@ class PrevisaoEvasao(models.Model):
         return f"{self.municipio.nome} - {self.ano}: {self.previsao}%"
 
 
+class PrevisaoMembroEnsemble(models.Model):
+    municipio = models.ForeignKey(Municipio, on_delete=models.CASCADE)
+    ano = models.IntegerField()
+    modelo = models.CharField(max_length=30)
+    previsao = models.FloatField()
+    limite_inferior = models.FloatField()
+    limite_superior = models.FloatField()
+    peso = models.FloatField()
+
+    class Meta:
+        unique_together = ('municipio', 'ano', 'modelo')
+
+    def __str__(self):
+        return f"{self.municipio.nome} - {self.ano} ({self.modelo}): {self.previsao}%"
+
+
+class IndiceSimilaridade(models.Model):
+    """Vizinhos mais próximos de cada município, em arrays numpy serializados"""
+    municipios = models.IntegerField()
+    vizinhos = models.IntegerField()
+    ano_inicial = models.IntegerField()
+    ano_final = models.IntegerField()
+    codigos = models.BinaryField()
+    indices = models.BinaryField()
+    distancias = models.BinaryField()
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Índice {self.pk}: {self.municipios} municípios x {self.vizinhos} vizinhos"
+
+
 class MetricasModelo(models.Model):
     municipio = models.OneToOneField(Municipio, on_delete=models.CASCADE)
     mae = models.FloatField()
@@ -51,4 +83,73 @@ class MetricasModelo(models.Model):
     data_calculo = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Métricas para {self.municipio.nome}"
\ No newline at end of file
+        return f"Métricas para {self.municipio.nome}"
+
+class ExecucaoProcessamento(models.Model):
+    STATUS_EM_ANDAMENTO = 'em_andamento'
+    STATUS_CONCLUIDA = 'concluida'
+    STATUS_CHOICES = [
+        (STATUS_EM_ANDAMENTO, 'Em andamento'),
+        (STATUS_CONCLUIDA, 'Concluída'),
+    ]
+
+    arquivo = models.CharField(max_length=255)
+    ufs = models.CharField(max_length=255)
+    tamanho_shard = models.IntegerField()
+    # Opções de modelagem; nulas em execuções gravadas antes de serem registradas
+    modo_intervalo = models.CharField(max_length=20, null=True, blank=True)
+    amostras_incerteza = models.IntegerField(null=True, blank=True)
+    ensemble = models.BooleanField(null=True, blank=True)
+    fallback_anomalias = models.BooleanField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_EM_ANDAMENTO)
+    municipios_processados = models.IntegerField(default=0)
+    municipios_com_falha = models.IntegerField(default=0)
+    iniciada_em = models.DateTimeField(auto_now_add=True)
+    finalizada_em = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Execução {self.pk} ({self.get_status_display()})"
+
+
+class RegistroMunicipioExecucao(models.Model):
+    STATUS_PROCESSADO = 'processado'
+    STATUS_IGNORADO = 'ignorado'
+    STATUS_FALHA = 'falha'
+    STATUS_CHOICES = [
+        (STATUS_PROCESSADO, 'Processado'),
+        (STATUS_IGNORADO, 'Ignorado'),
+        (STATUS_FALHA, 'Falha'),
+    ]
+
+    execucao = models.ForeignKey(ExecucaoProcessamento, on_delete=models.CASCADE, related_name='registros')
+    codigo = models.IntegerField()
+    uf = models.CharField(max_length=2)
+    shard = models.IntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    mensagem = models.TextField(blank=True)
+    registrado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('execucao', 'codigo')
+
+    def __str__(self):
+        return f"{self.codigo} - {self.get_status_display()}"
+
+
+class ProblemaQualidade(models.Model):
+    TIPO_CHOICES = [
+        (TIPO_ANO_AUSENTE, 'Ano ausente'),
+        (TIPO_FORA_DA_FAIXA, 'Fora da faixa'),
+        (TIPO_SALTO, 'Salto'),
+        (TIPO_DUPLICADO, 'Duplicado'),
+    ]
+
+    execucao = models.ForeignKey(ExecucaoProcessamento, on_delete=models.CASCADE, related_name='problemas')
+    codigo = models.IntegerField()
+    ano = models.IntegerField()
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    valor = models.FloatField(null=True, blank=True)
+    detalhe = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return f"{self.codigo} - {self.ano}: {self.get_tipo_display()}"
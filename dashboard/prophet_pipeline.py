@@ -1,23 +1,135 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from statistics import NormalDist
 import pandas as pd
 import numpy as np
 from prophet import Prophet
 from .utils import calcular_metricas
+from .leitura import ler_linhas, montar_filtros
+from .ensemble import prever_membros_simples, calcular_pesos, combinar_ensemble, MEMBRO_PROPHET
 import logging
 
 # Configurar logging
 logging.getLogger('prophet').setLevel(logging.WARNING)
 logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
 
+# Modos de cálculo dos intervalos de previsão
+MODO_SIMULACAO = 'simulacao'
+MODO_ANALITICO = 'analitico'
+
+AMOSTRAS_INCERTEZA_PADRAO = 1000
+ANO_VALIDACAO = 2024
+ANOS_PREVISAO = (2025, 2026)
+COLUNAS_PREVISAO = ['ds', 'yhat', 'yhat_lower', 'yhat_upper']
+
+
+def datas_anuais(anos):
+    """
+    Cria um dataframe futuro com uma data (31/12) por ano
+
+    Args:
+        anos (iterable): Anos a prever
+
+    Returns:
+        DataFrame: Dataframe com a coluna ds
+    """
+    return pd.DataFrame({'ds': pd.to_datetime([f'{ano}-12-31' for ano in anos])})
+
+
+# Validação e futuro em um único dataframe, compartilhado por todos os municípios
+FUTURO_PADRAO = datas_anuais((ANO_VALIDACAO,) + ANOS_PREVISAO)
+
+
+def criar_modelo(amostras_incerteza=AMOSTRAS_INCERTEZA_PADRAO, modo_intervalo=MODO_SIMULACAO):
+    """
+    Cria o modelo Prophet com a configuração do projeto
+
+    Args:
+        amostras_incerteza (int): Simulações usadas nos intervalos (modo simulação)
+        modo_intervalo (str): 'simulacao' ou 'analitico'
+
+    Returns:
+        Prophet: Modelo ainda não treinado
+    """
+    if modo_intervalo != MODO_ANALITICO and amostras_incerteza < 1:
+        # Sem amostras o Prophet não devolve yhat_lower/yhat_upper
+        raise ValueError(f"O modo '{MODO_SIMULACAO}' exige ao menos 1 amostra de incerteza; "
+                         f"use o modo '{MODO_ANALITICO}' para dispensar a simulação")
+
+    return Prophet(
+        yearly_seasonality=True,
+        seasonality_mode='multiplicative',
+        changepoint_prior_scale=0.05,
+        seasonality_prior_scale=10,
+        # No modo analítico o predict não simula incerteza
+        uncertainty_samples=0 if modo_intervalo == MODO_ANALITICO else amostras_incerteza
+    )
+
+
+def prever(modelo, futuro, modo_intervalo=MODO_SIMULACAO):
+    """
+    Faz a previsão de todos os horizontes em uma única chamada de predict
+
+    No modo analítico os intervalos são uma aproximação da simulação do Prophet:
+    yhat ± z·σ·√h, com σ igual ao desvio-padrão dos resíduos no treino e h o
+    número de anos após o fim do treino, para que o intervalo se alargue com o
+    horizonte como na simulação.
+
+    Args:
+        modelo (Prophet): Modelo treinado
+        futuro (DataFrame): Datas a prever (coluna ds)
+        modo_intervalo (str): 'simulacao' ou 'analitico'
+
+    Returns:
+        DataFrame: Previsões com intervalos de confiança
+    """
+    if modo_intervalo != MODO_ANALITICO:
+        return modelo.predict(futuro)[COLUNAS_PREVISAO]
+
+    # Histórico e futuro no mesmo predict, para obter os resíduos do treino
+    historico = modelo.history[['ds']]
+    n = len(historico)
+    previsao = modelo.predict(pd.concat([historico, futuro[['ds']]], ignore_index=True))
+
+    residuos = modelo.history['y'].to_numpy() - previsao['yhat'].to_numpy()[:n]
+    sigma = np.std(residuos, ddof=1) if n > 1 else 0.0
+    z = NormalDist().inv_cdf(0.5 + modelo.interval_width / 2)
+
+    previsao = previsao.iloc[n:].reset_index(drop=True)
+    horizonte = np.maximum(previsao['ds'].dt.year.to_numpy() - historico['ds'].dt.year.max(), 1)
+    margem = z * sigma * np.sqrt(horizonte)
+    previsao['yhat_lower'] = previsao['yhat'] - margem
+    previsao['yhat_upper'] = previsao['yhat'] + margem
+    return previsao[COLUNAS_PREVISAO]
+
+
+def _ajustar_e_prever(dados_treino, amostras_incerteza, modo_intervalo):
+    """Treina um Prophet e prevê validação e futuro (usado pelos processos do ensemble)"""
+    modelo = criar_modelo(amostras_incerteza, modo_intervalo)
+    modelo.fit(dados_treino)
+    return prever(modelo, FUTURO_PADRAO, modo_intervalo)
+
 
 class EvasaoProphetPipeline:
-    def __init__(self, dados_historicos):
+    def __init__(self, dados_historicos, amostras_incerteza=AMOSTRAS_INCERTEZA_PADRAO,
+                 modo_intervalo=MODO_SIMULACAO, ensemble=False, workers=1):
         """
         Inicializa o pipeline de previsão com Prophet
 
         Args:
             dados_historicos (DataFrame): DataFrame com dados históricos de evasão
+            amostras_incerteza (int): Simulações usadas nos intervalos (modo simulação)
+            modo_intervalo (str): 'simulacao' ou 'analitico'
+            ensemble (bool): Combinar Prophet com ingênuo, deriva, Holt e tendência linear
+            workers (int): Processos usados para ajustar o Prophet no modo ensemble
         """
         self.dados_historicos = dados_historicos
+        self.amostras_incerteza = amostras_incerteza
+        self.modo_intervalo = modo_intervalo
+        self.ensemble = ensemble
+        self.workers = workers
+        self.pesos = {}
         self.modelos = {}
         self.previsoes = {}
         self.metricas = {}
@@ -62,12 +174,7 @@ class EvasaoProphetPipeline:
             Prophet: Modelo treinado
         """
         # Configurar e treinar o modelo
-        modelo = Prophet(
-            yearly_seasonality=True,
-            seasonality_mode='multiplicative',
-            changepoint_prior_scale=0.05,
-            seasonality_prior_scale=10
-        )
+        modelo = criar_modelo(self.amostras_incerteza, self.modo_intervalo)
 
         modelo.fit(dados_treino)
         return modelo
@@ -83,13 +190,11 @@ class EvasaoProphetPipeline:
         Returns:
             DataFrame: Previsões com intervalos de confiança
         """
-        # Criar dataframe futuro
-        futuro = modelo.make_future_dataframe(periods=periodos, freq='Y', include_history=False)
+        # Criar dataframe futuro a partir do último ano do treino
+        ultimo_ano = modelo.history['ds'].max().year
+        futuro = datas_anuais(range(ultimo_ano + 1, ultimo_ano + 1 + periodos))
 
-        # Fazer previsão
-        previsao = modelo.predict(futuro)
-
-        return previsao[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+        return prever(modelo, futuro, self.modo_intervalo)
 
     def executar_pipeline(self, municipio_codigo):
         """
@@ -116,12 +221,10 @@ class EvasaoProphetPipeline:
             modelo = self.treinar_modelo(dados_treino)
             self.modelos[municipio_codigo] = modelo
 
-            # Fazer previsão para validação (2024) e futuro (2025-2026)
-            previsao_validacao = modelo.predict(
-                modelo.make_future_dataframe(periods=1, freq='Y', include_history=False)
-            )
-
-            previsao_futuro = self.fazer_previsao(modelo, periodos=2)
+            # Uma única previsão cobre validação (2024) e futuro (2025-2026)
+            previsao = prever(modelo, FUTURO_PADRAO, self.modo_intervalo)
+            previsao_validacao = previsao[previsao['ds'].dt.year == ANO_VALIDACAO]
+            previsao_futuro = previsao[previsao['ds'].dt.year.isin(ANOS_PREVISAO)].reset_index(drop=True)
 
             # Calcular métricas se houver dados de validação
             if not dados_validacao.empty:
@@ -133,7 +236,7 @@ class EvasaoProphetPipeline:
             # Preparar resultados
             resultados = {
                 'historico': dados_completos,
-                'previsao_2024': previsao_validacao[['ds', 'yhat', 'yhat_lower', 'yhat_upper']],
+                'previsao_2024': previsao_validacao,
                 'previsao_2025_2026': previsao_futuro,
                 'metricas': self.metricas.get(municipio_codigo, {})
             }
@@ -151,6 +254,9 @@ class EvasaoProphetPipeline:
         Returns:
             dict: Resultados para todos os municípios
         """
+        if self.ensemble:
+            return self.processar_ensemble()
+
         resultados_gerais = {}
         municipios = self.dados_historicos['Código do Município'].unique()
 
@@ -161,26 +267,122 @@ class EvasaoProphetPipeline:
 
         return resultados_gerais
 
+    def processar_ensemble(self):
+        """
+        Processa todos os municípios no modo ensemble
+
+        O Prophet (membro mais caro) é ajustado em paralelo nos processos, enquanto
+        os membros baratos são calculados de forma vetorizada para todos os
+        municípios. Os pesos (inverso do erro em 2024) e a combinação também são
+        calculados de uma só vez para o lote inteiro.
+
+        Returns:
+            dict: Resultados para todos os municípios, com previsões por membro
+        """
+        historicos = {}
+        treinos = {}
+        y_validacao = {}
+        for municipio_codigo in self.dados_historicos['Código do Município'].unique():
+            dados_completos = self.preparar_dados(municipio_codigo)
+            dados_treino = dados_completos[dados_completos['ds'] < '2024-01-01']
+            if dados_treino.empty:
+                print(f"Erro ao processar município {municipio_codigo}: Dados de treino insuficientes (2018-2023)")
+                continue
+            historicos[municipio_codigo] = dados_completos
+            treinos[municipio_codigo] = dados_treino
+            validacao = dados_completos.loc[dados_completos['ds'].dt.year == ANO_VALIDACAO, 'y']
+            if not validacao.empty:
+                y_validacao[municipio_codigo] = validacao.mean()
+
+        membros = {}
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futuros = {
+                codigo: executor.submit(_ajustar_e_prever, dados_treino, self.amostras_incerteza,
+                                        self.modo_intervalo)
+                for codigo, dados_treino in treinos.items()
+            }
+
+            # Membros baratos calculados enquanto os processos ajustam o Prophet
+            membros.update(prever_membros_simples(treinos, FUTURO_PADRAO))
+
+            membros[MEMBRO_PROPHET] = {}
+            for codigo, futuro in futuros.items():
+                try:
+                    membros[MEMBRO_PROPHET][codigo] = futuro.result()
+                except Exception as e:
+                    print(f"Erro ao ajustar Prophet no município {codigo}: {str(e)}")
+
+        self.pesos = calcular_pesos(membros, y_validacao, FUTURO_PADRAO, ANO_VALIDACAO)
+        combinados = combinar_ensemble(membros, self.pesos, FUTURO_PADRAO)
+
+        resultados_gerais = {}
+        for codigo, previsao in combinados.items():
+            if codigo in y_validacao:
+                y_pred = previsao.loc[previsao['ds'].dt.year == ANO_VALIDACAO, 'yhat'].values
+                self.metricas[codigo] = calcular_metricas(np.array([y_validacao[codigo]]), y_pred)
+
+            self.previsoes[codigo] = previsao
+            resultados_gerais[codigo] = {
+                'historico': historicos[codigo],
+                'previsao_2024': previsao[previsao['ds'].dt.year == ANO_VALIDACAO],
+                'previsao_2025_2026': previsao[previsao['ds'].dt.year.isin(ANOS_PREVISAO)].reset_index(drop=True),
+                'membros': {membro: previsoes[codigo] for membro, previsoes in membros.items()
+                            if codigo in previsoes},
+                'pesos': self.pesos,
+                'metricas': self.metricas.get(codigo, {})
+            }
+
+        return resultados_gerais
+
+
+def _processar_particao_uf(dados_uf, amostras_incerteza=AMOSTRAS_INCERTEZA_PADRAO, modo_intervalo=MODO_SIMULACAO,
+                           ensemble=False, workers=1):
+    """Executa o pipeline para os municípios de uma única UF"""
+    pipeline = EvasaoProphetPipeline(dados_uf, amostras_incerteza, modo_intervalo, ensemble, workers)
+    return pipeline.processar_todos_municipios()
+
 
 # Função principal para executar o pipeline
-def executar_pipeline_prophet(caminho_arquivo):
+def executar_pipeline_prophet(caminho_arquivo, ufs=('SP',), workers=None,
+                              amostras_incerteza=AMOSTRAS_INCERTEZA_PADRAO, modo_intervalo=MODO_SIMULACAO,
+                              ensemble=False):
     """
     Função principal para executar o pipeline completo
 
+    Cada UF é uma partição independente; com mais de uma UF as partições são
+    processadas em paralelo, uma por processo.
+
     Args:
         caminho_arquivo (str): Caminho para o arquivo Excel com os dados
+        ufs (iterable): Siglas das UFs a processar; None processa todas
+        workers (int): Número de processos paralelos (padrão: número de CPUs)
+        amostras_incerteza (int): Simulações usadas nos intervalos (modo simulação)
+        modo_intervalo (str): 'simulacao' ou 'analitico'
+        ensemble (bool): Combinar Prophet com ingênuo, deriva, Holt e tendência linear
 
     Returns:
         dict: Resultados do pipeline para todos os municípios
     """
-    # Carregar dados
-    dados = pd.read_excel(caminho_arquivo)
-
-    # Filtrar apenas para SP e coluna Total
-    dados_sp = dados[dados['UF'] == 'SP'].copy()
-
-    # Criar e executar pipeline
-    pipeline = EvasaoProphetPipeline(dados_sp)
-    resultados = pipeline.processar_todos_municipios()
-
-    return resultados
\ No newline at end of file
+    # Carregar dados em streaming, já filtrados por UF e linhas Total
+    dados = pd.DataFrame(ler_linhas(caminho_arquivo, montar_filtros(ufs)))
+    if dados.empty:
+        return {}
+
+    particoes = [dados_uf for _, dados_uf in dados.groupby('UF')]
+    processar = partial(_processar_particao_uf, amostras_incerteza=amostras_incerteza,
+                        modo_intervalo=modo_intervalo, ensemble=ensemble)
+
+    if len(particoes) == 1 or workers == 1:
+        # Sem paralelismo entre UFs, o ensemble usa os processos para o Prophet
+        resultados = {}
+        for dados_uf in particoes:
+            resultados.update(processar(dados_uf, workers=workers or os.cpu_count() or 1))
+        return resultados
+
+    # Criar e executar um pipeline por UF
+    resultados = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for resultados_uf in executor.map(processar, particoes):
+            resultados.update(resultados_uf)
+
+    return resultados
@@ -0,0 +1,161 @@
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+from .leitura import COLUNAS_NUMERICAS
+
+# Tipos de problema encontrados na verificação de qualidade
+TIPO_ANO_AUSENTE = 'ano_ausente'
+TIPO_FORA_DA_FAIXA = 'fora_da_faixa'
+TIPO_SALTO = 'salto'
+TIPO_DUPLICADO = 'duplicado'
+
+# Problemas que distorcem o ajuste e justificam o modelo alternativo
+TIPOS_GRAVES = frozenset({TIPO_FORA_DA_FAIXA, TIPO_SALTO, TIPO_DUPLICADO})
+
+LIMITE_Z_ROBUSTO = 3.5
+FAIXA_PERCENTUAL = (0.0, 100.0)
+
+COLUNAS_PROBLEMAS = ['codigo', 'ano', 'tipo', 'valor', 'detalhe']
+
+
+def verificar_qualidade(dados, limite_z=LIMITE_Z_ROBUSTO):
+    """
+    Verifica de uma só vez a qualidade de todas as séries de um lote de municípios
+
+    Todas as verificações são vetorizadas sobre o lote:
+    - anos ausentes em relação ao intervalo de anos do lote;
+    - percentuais fora da faixa 0-100;
+    - saltos anuais com z-score robusto (mediana/MAD de todas as variações do lote)
+      acima do limite;
+    - linhas duplicadas para o mesmo (código, ano).
+
+    Args:
+        dados (DataFrame): Linhas filtradas de vários municípios
+        limite_z (float): Limite do z-score robusto para considerar um salto
+
+    Returns:
+        DataFrame: Problemas encontrados (codigo, ano, tipo, valor, detalhe)
+    """
+    if dados.empty:
+        return pd.DataFrame(columns=COLUNAS_PROBLEMAS)
+
+    codigo, ano = 'Código do Município', 'Ano'
+    problemas = []
+
+    # Duplicados (codigo, ano)
+    duplicados = dados[dados.duplicated([codigo, ano], keep=False)]
+    if not duplicados.empty:
+        contagem = duplicados.groupby([codigo, ano]).size().reset_index(name='n')
+        problemas.append(pd.DataFrame({
+            'codigo': contagem[codigo],
+            'ano': contagem[ano],
+            'tipo': TIPO_DUPLICADO,
+            'valor': contagem['n'].astype(float),
+            'detalhe': 'linhas repetidas para o mesmo ano',
+        }))
+
+    # Percentuais fora da faixa
+    minimo, maximo = FAIXA_PERCENTUAL
+    for coluna in COLUNAS_NUMERICAS:
+        if coluna not in dados.columns:
+            continue
+        valores = dados[coluna]
+        fora = dados[valores.notna() & ((valores < minimo) | (valores > maximo))]
+        if not fora.empty:
+            problemas.append(pd.DataFrame({
+                'codigo': fora[codigo],
+                'ano': fora[ano],
+                'tipo': TIPO_FORA_DA_FAIXA,
+                'valor': fora[coluna],
+                'detalhe': f'{coluna} fora de {minimo:g}-{maximo:g}',
+            }))
+
+    # Uma série por linha (município) e um ano por coluna
+    series = dados.pivot_table(index=codigo, columns=ano, values='Total', aggfunc='mean')
+    series = series.reindex(columns=range(int(series.columns.min()), int(series.columns.max()) + 1))
+
+    # Anos ausentes
+    ausentes = series.isna().stack()
+    ausentes = ausentes[ausentes].index.to_frame(index=False)
+    if not ausentes.empty:
+        problemas.append(pd.DataFrame({
+            'codigo': ausentes[codigo],
+            'ano': ausentes[ano],
+            'tipo': TIPO_ANO_AUSENTE,
+            'valor': np.nan,
+            'detalhe': 'ano sem dado de Total',
+        }))
+
+    # Saltos: z-score robusto das variações anuais, com mediana e MAD de todo o lote
+    variacoes = series.diff(axis=1).iloc[:, 1:]
+    todas = variacoes.to_numpy().ravel()
+    todas = todas[~np.isnan(todas)]
+    if len(todas) > 0:
+        mediana = np.median(todas)
+        mad = np.median(np.abs(todas - mediana))
+        if mad > 0:
+            z = 0.6745 * (variacoes - mediana) / mad
+            saltos = z.where(z.abs() > limite_z).stack().dropna().rename('z').reset_index()
+            if not saltos.empty:
+                problemas.append(pd.DataFrame({
+                    'codigo': saltos[codigo],
+                    'ano': saltos[ano],
+                    'tipo': TIPO_SALTO,
+                    'valor': saltos['z'],
+                    'detalhe': 'variação anual com z-score robusto acima do limite',
+                }))
+
+    if not problemas:
+        return pd.DataFrame(columns=COLUNAS_PROBLEMAS)
+
+    resultado = pd.concat(problemas, ignore_index=True)[COLUNAS_PROBLEMAS]
+    resultado['codigo'] = resultado['codigo'].astype(int)
+    resultado['ano'] = resultado['ano'].astype(int)
+    return resultado
+
+
+def municipios_sinalizados(problemas, tipos=TIPOS_GRAVES):
+    """
+    Códigos de municípios com ao menos um problema dos tipos informados
+
+    Args:
+        problemas (DataFrame): Resultado de verificar_qualidade
+        tipos (set): Tipos de problema considerados
+
+    Returns:
+        frozenset: Códigos dos municípios sinalizados
+    """
+    return frozenset(problemas.loc[problemas['tipo'].isin(tipos), 'codigo'].astype(int))
+
+
+def prever_fallback(dados_treino, futuro, interval_width=0.8):
+    """
+    Previsão barata e robusta para séries sinalizadas: mediana dos três últimos anos
+
+    O intervalo usa a MAD das variações anuais, o que o torna pouco sensível
+    aos mesmos saltos que levaram a série ao modelo alternativo.
+
+    Args:
+        dados_treino (DataFrame): Dados de treino no formato Prophet (ds, y)
+        futuro (DataFrame): Datas a prever (coluna ds)
+        interval_width (float): Cobertura do intervalo, como no Prophet
+
+    Returns:
+        DataFrame: Previsões com intervalos de confiança
+    """
+    # Duplicados viram a média do ano
+    serie = dados_treino.groupby('ds')['y'].mean().sort_index()
+    nivel = float(np.median(serie.to_numpy()[-3:]))
+
+    variacoes = np.diff(serie.to_numpy())
+    if len(variacoes) > 0:
+        escala = 1.4826 * float(np.median(np.abs(variacoes - np.median(variacoes))))
+    else:
+        escala = 0.0
+    z = NormalDist().inv_cdf(0.5 + interval_width / 2)
+
+    previsao = futuro[['ds']].reset_index(drop=True).copy()
+    previsao['yhat'] = nivel
+    previsao['yhat_lower'] = nivel - z * escala
+    previsao['yhat_upper'] = nivel + z * escala
+    return previsao
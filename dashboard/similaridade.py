@@ -0,0 +1,188 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+# Vizinhos guardados por município no índice
+VIZINHOS_PADRAO = 20
+
+# Mínimo de anos observados para a trajetória entrar no índice
+ANOS_MINIMOS = 3
+
+# Linhas da matriz de distâncias calculadas por vez, para limitar a memória
+TAMANHO_BLOCO = 1024
+
+# Segundos entre verificações de um índice mais novo no banco
+INTERVALO_VERIFICACAO = 30.0
+
+# Índice mais recente carregado em memória, compartilhado entre requisições
+_indice_carregado = None
+_verificado_em = 0.0
+_trava = threading.Lock()
+
+
+def normalizar_trajetorias(series):
+    """
+    Normaliza as trajetórias para comparar a forma das curvas, e não o nível
+
+    Anos faltantes no meio da série são interpolados e, nas pontas, repetidos.
+    Cada linha é centrada na média e dividida pelo desvio-padrão; séries
+    constantes ficam zeradas.
+
+    Args:
+        series (DataFrame): Uma linha por município, uma coluna por ano
+
+    Returns:
+        ndarray: Matriz float32 municípios x anos
+    """
+    valores = series.interpolate(axis=1, limit_direction='both').to_numpy(dtype=float)
+    media = valores.mean(axis=1, keepdims=True)
+    desvio = valores.std(axis=1, keepdims=True)
+    desvio[desvio == 0] = 1.0
+    return ((valores - media) / desvio).astype(np.float32)
+
+
+def vizinhos_mais_proximos(matriz, k, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Calcula os k vizinhos mais próximos de cada linha pela distância euclidiana
+
+    A matriz de distâncias é calculada em blocos de linhas com
+    ||a||² + ||b||² - 2ab, e os k menores de cada linha saem com argpartition,
+    sem ordenar a linha inteira.
+
+    Args:
+        matriz (ndarray): Trajetórias normalizadas (municípios x anos)
+        k (int): Número de vizinhos
+        tamanho_bloco (int): Linhas processadas por vez
+
+    Returns:
+        tuple: (índices int32, distâncias float32), ambos municípios x k
+    """
+    n = len(matriz)
+    k = min(k, n - 1)
+    indices = np.empty((n, max(k, 0)), dtype=np.int32)
+    distancias = np.empty((n, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return indices, distancias
+
+    normas = np.einsum('ij,ij->i', matriz, matriz)
+    for inicio in range(0, n, tamanho_bloco):
+        bloco = matriz[inicio:inicio + tamanho_bloco]
+        linhas = np.arange(len(bloco))
+        quadrados = normas[inicio:inicio + len(bloco), np.newaxis] + normas[np.newaxis, :] - 2 * bloco @ matriz.T
+        # O próprio município não é vizinho de si mesmo
+        quadrados[linhas, inicio + linhas] = np.inf
+
+        candidatos = np.argpartition(quadrados, k - 1, axis=1)[:, :k]
+        valores = np.take_along_axis(quadrados, candidatos, axis=1)
+        ordem = np.argsort(valores, axis=1)
+        indices[inicio:inicio + len(bloco)] = np.take_along_axis(candidatos, ordem, axis=1)
+        distancias[inicio:inicio + len(bloco)] = np.sqrt(np.maximum(np.take_along_axis(valores, ordem, axis=1), 0))
+
+    return indices, distancias
+
+
+def construir_indice(k=VIZINHOS_PADRAO, using='default'):
+    """
+    Constrói e grava o índice de similaridade a partir de DadosEvasao.total
+
+    Args:
+        k (int): Vizinhos guardados por município
+        using (str): Alias do banco usado na leitura e na gravação
+
+    Returns:
+        IndiceSimilaridade: Índice gravado, ou None se não houver municípios suficientes
+            (nesse caso o índice anterior é removido)
+    """
+    from .models import DadosEvasao, IndiceSimilaridade
+
+    dados = pd.DataFrame.from_records(
+        DadosEvasao.objects.using(using).values_list('municipio__codigo', 'ano', 'total'),
+        columns=['codigo', 'ano', 'total']
+    )
+    series = pd.DataFrame()
+    if not dados.empty:
+        series = dados.pivot_table(index='codigo', columns='ano', values='total', aggfunc='mean')
+        series = series.reindex(columns=range(int(series.columns.min()), int(series.columns.max()) + 1))
+        series = series[series.notna().sum(axis=1) >= ANOS_MINIMOS]
+    if len(series) < 2:
+        # Um índice antigo apontaria para municípios que não existem mais
+        IndiceSimilaridade.objects.using(using).all().delete()
+        return None
+
+    matriz = normalizar_trajetorias(series)
+    indices, distancias = vizinhos_mais_proximos(matriz, k)
+    codigos = series.index.to_numpy(dtype=np.int64)
+
+    indice = IndiceSimilaridade.objects.using(using).create(
+        municipios=len(codigos),
+        vizinhos=indices.shape[1],
+        ano_inicial=int(series.columns.min()),
+        ano_final=int(series.columns.max()),
+        codigos=codigos.tobytes(),
+        indices=indices.tobytes(),
+        distancias=distancias.tobytes(),
+    )
+    # Apenas o índice mais recente é consultado
+    IndiceSimilaridade.objects.using(using).exclude(pk=indice.pk).delete()
+
+    print(f"🧭 Índice de similaridade: {len(codigos)} municípios, {indices.shape[1]} vizinhos cada")
+    return indice
+
+
+class _IndiceEmMemoria:
+    """Índice desserializado, com o mapa código -> linha para consulta direta"""
+
+    def __init__(self, indice):
+        self.pk = indice.pk
+        self.codigos = np.frombuffer(indice.codigos, dtype=np.int64)
+        self.indices = np.frombuffer(indice.indices, dtype=np.int32).reshape(indice.municipios, indice.vizinhos)
+        self.distancias = np.frombuffer(indice.distancias, dtype=np.float32).reshape(
+            indice.municipios, indice.vizinhos)
+        self.linhas = {codigo: linha for linha, codigo in enumerate(self.codigos.tolist())}
+
+
+def _carregar_indice():
+    """
+    Índice mais recente em memória
+
+    O banco só é consultado na primeira chamada e, depois, a cada
+    INTERVALO_VERIFICACAO segundos; nas demais a consulta não faz nenhum acesso.
+    """
+    from .models import IndiceSimilaridade
+
+    global _indice_carregado, _verificado_em
+    with _trava:
+        agora = time.monotonic()
+        if _indice_carregado is not None and agora - _verificado_em < INTERVALO_VERIFICACAO:
+            return _indice_carregado
+
+        atual = IndiceSimilaridade.objects.order_by('-pk').values_list('pk', flat=True).first()
+        if atual is None:
+            raise ValueError("O índice de similaridade ainda não foi construído")
+        if _indice_carregado is None or _indice_carregado.pk != atual:
+            _indice_carregado = _IndiceEmMemoria(IndiceSimilaridade.objects.get(pk=atual))
+        _verificado_em = agora
+        return _indice_carregado
+
+
+def municipios_similares(codigo, quantidade=10, indice=None):
+    """
+    Municípios com trajetória de evasão mais parecida com a do município informado
+
+    Args:
+        codigo (int): Código do município
+        quantidade (int): Número de municípios a retornar (até o k do índice)
+        indice (_IndiceEmMemoria): Índice já carregado; se omitido, usa o mais recente
+
+    Returns:
+        list: Pares (código, distância), do mais parecido ao menos parecido
+    """
+    indice = indice or _carregar_indice()
+    linha = indice.linhas.get(int(codigo))
+    if linha is None:
+        raise ValueError(f"O município {codigo} não está no índice de similaridade")
+
+    quantidade = max(0, min(int(quantidade), indice.indices.shape[1]))
+    vizinhos = indice.indices[linha, :quantidade]
+    return list(zip(indice.codigos[vizinhos].tolist(), indice.distancias[linha, :quantidade].tolist()))
@@ -6,4 +6,6 @@ urlpatterns = [
     path('signup/', views.signup, name='signup'),
     path('login/', views.custom_login, name='login'),
 path('logout/', views.custom_logout, name='logout'),
+    path('api/cenarios/', views.api_cenario, name='api_cenario'),
+    path('api/similares/', views.api_similares, name='api_similares'),
 ]
\ No newline at end of file
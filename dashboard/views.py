@@ -1,11 +1,16 @@
+from functools import wraps
+from django.conf import settings
+from django.db import connection, transaction
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate, logout
 from django.contrib import messages
 from .forms import SignUpForm
+from .cenarios import interpretar_ajustes, simular_cenario, simular_regiao, MODO_APROXIMADO
+from .similaridade import municipios_similares
 from .models import Municipio, DadosEvasao, PrevisaoEvasao, MetricasModelo
 from django.core.paginator import Paginator
-from django.http import HttpRequest
+from django.http import HttpRequest, JsonResponse
 from django.db.models import Q
 
 
@@ -25,6 +30,26 @@ def signup(request):
     return render(request, 'signup.html', {'form': form})
 
 
+def limitar_tempo_consultas(view):
+    """
+    Cancela as consultas da view que passarem de DB_STATEMENT_TIMEOUT_MS (apenas PostgreSQL)
+
+    O limite é definido com SET LOCAL na transação da requisição, então não
+    fica na conexão devolvida ao pool nem alcança o admin, o migrate ou os
+    comandos de gerenciamento.
+    """
+    @wraps(view)
+    def view_limitada(request, *args, **kwargs):
+        if connection.vendor != 'postgresql':
+            return view(request, *args, **kwargs)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT set_config('statement_timeout', %s, true)",
+                               [str(settings.DB_STATEMENT_TIMEOUT_MS)])
+            return view(request, *args, **kwargs)
+    return view_limitada
+
+
 def custom_login(request):
     if request.method == 'POST':
         username = request.POST['username']
@@ -39,14 +64,32 @@ def custom_login(request):
 
 
 @login_required
+@limitar_tempo_consultas
 def dashboard(request: HttpRequest):
     # Número de itens por página
     ITEMS_PER_PAGE = 200000
 
+    # Filtro por UF (vazio = todas as UFs)
+    ufs = list(Municipio.objects.order_by('uf').values_list('uf', flat=True).distinct())
+    uf_selecionada = request.GET.get('uf', '').upper()
+    if uf_selecionada not in ufs:
+        uf_selecionada = ''
+
+    municipios = Municipio.objects.all()
+    dados_brutos_query = DadosEvasao.objects.select_related('municipio')
+    previsoes_query = PrevisaoEvasao.objects.select_related('municipio')
+    metricas = MetricasModelo.objects.select_related('municipio')
+
+    if uf_selecionada:
+        municipios = municipios.filter(uf=uf_selecionada)
+        dados_brutos_query = dados_brutos_query.filter(municipio__uf=uf_selecionada)
+        previsoes_query = previsoes_query.filter(municipio__uf=uf_selecionada)
+        metricas = metricas.filter(municipio__uf=uf_selecionada)
+
     # Buscar dados reais do banco - ADICIONAR ORDER_BY!
-    dados_brutos_query = DadosEvasao.objects.select_related('municipio').order_by('-ano', 'municipio__nome')
-    previsoes_query = PrevisaoEvasao.objects.select_related('municipio').order_by('municipio__nome', 'ano')
-    metricas = MetricasModelo.objects.select_related('municipio').order_by('municipio__nome')
+    dados_brutos_query = dados_brutos_query.order_by('-ano', 'municipio__nome')
+    previsoes_query = previsoes_query.order_by('municipio__nome', 'ano')
+    metricas = metricas.order_by('municipio__nome')
 
     # Paginação
     page_number = request.GET.get('page', 1)
@@ -75,7 +118,9 @@ def dashboard(request: HttpRequest):
             'rmse': m.rmse,
             'mape': m.mape
         } for m in metricas],
-        'total_municipios': Municipio.objects.count(),
+        'total_municipios': municipios.count(),
+        'ufs': ufs,
+        'uf_selecionada': uf_selecionada,
         'usuario': request.user,
         'periodo_treino': '2018-2023',
         'periodo_validacao': '2024'
@@ -84,6 +129,67 @@ def dashboard(request: HttpRequest):
     return render(request, 'dashboard.html', context)
 
 
+@login_required
+@limitar_tempo_consultas
+def api_cenario(request: HttpRequest):
+    """
+    Simula um cenário "e se": ajusta observações e devolve as previsões refeitas
+
+    Parâmetros (GET): codigo, ou regiao/uf; ajuste=ano:percentual (repetível);
+    modo=aproximado|completo.
+    """
+    try:
+        ajustes = interpretar_ajustes(request.GET.getlist('ajuste'))
+        modo = request.GET.get('modo', MODO_APROXIMADO)
+
+        if request.GET.get('codigo'):
+            codigo = int(request.GET['codigo'])
+            previsoes = simular_cenario(codigo, ajustes, modo)
+            resultado = {'codigo': codigo, 'previsoes': previsoes}
+        elif request.GET.get('regiao') or request.GET.get('uf'):
+            resultado = simular_regiao(
+                ajustes, regiao=request.GET.get('regiao'), uf=request.GET.get('uf'), modo=modo
+            )
+        else:
+            raise ValueError("Informe o código do município, a região ou a UF")
+
+    except ValueError as e:
+        return JsonResponse({'erro': str(e)}, status=400)
+
+    resultado['ajustes'] = [{'ano': ano, 'percentual': percentual} for ano, percentual in ajustes]
+    resultado['modo'] = modo
+    return JsonResponse(resultado)
+
+
+@login_required
+@limitar_tempo_consultas
+def api_similares(request: HttpRequest):
+    """
+    Municípios com trajetória de evasão mais parecida, consultados no índice pré-calculado
+
+    Parâmetros (GET): codigo; n=quantidade (padrão 10).
+    """
+    try:
+        if not request.GET.get('codigo'):
+            raise ValueError("Informe o código do município")
+        codigo = int(request.GET['codigo'])
+        quantidade = int(request.GET.get('n', 10))
+        similares = municipios_similares(codigo, quantidade)
+    except ValueError as e:
+        return JsonResponse({'erro': str(e)}, status=400)
+
+    vizinhos = Municipio.objects.filter(codigo__in=[vizinho for vizinho, _ in similares])
+    nomes = {municipio['codigo']: municipio for municipio in vizinhos.values('codigo', 'nome', 'uf')}
+
+    return JsonResponse({
+        'codigo': codigo,
+        'similares': [
+            {**nomes.get(vizinho, {'codigo': vizinho}), 'distancia': distancia}
+            for vizinho, distancia in similares
+        ],
+    })
+
+
 def custom_logout(request):
     logout(request)
     return redirect('home')
\ No newline at end of file
@@ -73,23 +73,67 @@ TEMPLATES = [
 WSGI_APPLICATION = 'evasao_project.wsgi.application'
 
 # Database
-# Usar PostgreSQL no Render, SQLite localmente
+# Usar PostgreSQL no Render, SQLite localmente.
+# 'default' atende as requisições do dashboard; 'ingestao' é usada pelo
+# processamento (processar_evasao), com transações longas e lotes maiores.
+DB_POOL = os.environ.get('DB_POOL', 'True') == 'True'
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', 2))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', 10))
+# Limite por consulta das views do dashboard (aplicado na transação da requisição,
+# não na conexão: migrate, admin e comandos de gerenciamento não são limitados)
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 5000))
+
+# Linhas por INSERT nas gravações em lote do processamento
+INGESTAO_TAMANHO_LOTE = int(os.environ.get('INGESTAO_TAMANHO_LOTE', 1000))
+
+# Pragmas do SQLite: WAL permite leituras durante a gravação do processamento
+SQLITE_PRAGMAS = ';'.join([
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-20000',  # 20 MB
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=134217728',  # 128 MB
+])
+
 if os.environ.get('DATABASE_URL'):
-    DATABASES = {
-        'default': dj_database_url.config(
-            default=os.environ.get('DATABASE_URL'),
-            conn_max_age=600,
-            ssl_require=not DEBUG
-        )
-    }
+    banco_web = dj_database_url.config(
+        default=os.environ.get('DATABASE_URL'),
+        conn_max_age=600,
+        conn_health_checks=True,
+        ssl_require=not DEBUG
+    )
 else:
-    DATABASES = {
-        'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-        }
+    banco_web = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 
+banco_ingestao = dict(banco_web, OPTIONS=dict(banco_web.get('OPTIONS', {})))
+banco_web['OPTIONS'] = dict(banco_web.get('OPTIONS', {}))
+
+if banco_web['ENGINE'] == 'django.db.backends.postgresql':
+    if DB_POOL:
+        # Com o pool nativo do psycopg, a conexão volta ao pool ao fim da requisição
+        banco_web['CONN_MAX_AGE'] = 0
+        banco_web['OPTIONS']['pool'] = {'min_size': DB_POOL_MIN, 'max_size': DB_POOL_MAX, 'timeout': 10}
+    # O processamento não tem limite por consulta e não espera o fsync de cada
+    # commit: uma queda perde só os últimos shards, refeitos com --retomar
+    banco_ingestao['OPTIONS']['options'] = '-c statement_timeout=0 -c synchronous_commit=off'
+elif banco_web['ENGINE'] == 'django.db.backends.sqlite3':
+    # BEGIN IMMEDIATE evita o "database is locked" ao promover uma leitura a escrita
+    banco_web['OPTIONS'].update(init_command=SQLITE_PRAGMAS, transaction_mode='IMMEDIATE', timeout=5)
+    # Mesmo arquivo; o processamento espera mais pelo bloqueio de escrita
+    banco_ingestao['OPTIONS'].update(init_command=SQLITE_PRAGMAS, transaction_mode='IMMEDIATE', timeout=60)
+
+banco_ingestao['TEST'] = {'MIRROR': 'default'}
+
+DATABASES = {
+    'default': banco_web,
+    'ingestao': banco_ingestao,
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -125,6 +169,9 @@ LOGOUT_REDIRECT_URL = 'home'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cenários "e se": número máximo de simulações mantidas no cache LRU
+CENARIOS_CACHE_TAMANHO = int(os.environ.get('CENARIOS_CACHE_TAMANHO', 256))
+
 # Security settings for production
 if not DEBUG:
     # HTTPS settings